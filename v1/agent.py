@@ -6,11 +6,16 @@ from snake.snake_game import SnakeGameAI, Direction, Point, BLOCK_SIZE
 from model import Linear_QNet, QTrainer
 from helper import plot, model_folder_path, ShareResources
 import os
+import time
 
 MAX_MEMORY = 100_000
 BATCH_SIZE = 1000
 # Learning rate
 LR = 1e-3
+# Redrawing the plot after every game costs more than the training itself, so it's off by default
+LIVE_PLOT = False
+# Seconds between redraws when it's on
+PLOT_INTERVAL = 5
 
 # Agent class used to manage the game and AI
 class Agent:
@@ -134,6 +139,7 @@ def train(agent):
     plot_mean_scores = []
     total_score = 0
     record = 0
+    last_plot = 0
     game = SnakeGameAI()
     while True:
         # Get old/curr state
@@ -169,7 +175,9 @@ def train(agent):
             total_score += score
             mean_score = total_score / agent.n_games
             plot_mean_scores.append(mean_score)
-            plot(plot_scores, plot_mean_scores)
+            if LIVE_PLOT and time.time() - last_plot >= PLOT_INTERVAL:
+                plot(plot_scores, plot_mean_scores)
+                last_plot = time.time()
 
 if __name__ == "__main__":
     threads = 5
@@ -3,7 +3,8 @@
 import pygame
 import random
 from enum import Enum
-from collections import namedtuple
+from collections import namedtuple, deque
+from itertools import islice
 import os
 import numpy as np
 
@@ -55,21 +56,39 @@ class SnakeGameAI:
         self.direction = Direction.RIGHT
         
         self.head = Point(self.w/2, self.h/2)
-        self.snake = [self.head, 
-                      Point(self.head.x-BLOCK_SIZE, self.head.y),
-                      Point(self.head.x-(2*BLOCK_SIZE), self.head.y)]
+        # deque so adding the head and popping the tail are O(1)
+        self.snake = deque([self.head, 
+                            Point(self.head.x-BLOCK_SIZE, self.head.y),
+                            Point(self.head.x-(2*BLOCK_SIZE), self.head.y)])
         
+        # Every cell the snake isn't on, plus where each one sits in the list so taking one out is a swap with the last one
+        self.free_cells = [Point(x*BLOCK_SIZE, y*BLOCK_SIZE) for x in range(self.w//BLOCK_SIZE) for y in range(self.h//BLOCK_SIZE)]
+        self.free_index = {pt: i for i, pt in enumerate(self.free_cells)}
+        for pt in self.snake:
+            self._take_cell(pt)
+
         self.score = 0
         self.food = None
         self._place_food()
         self.frame_iteration = 0
+
+    def _take_cell(self, pt):
+        i = self.free_index.pop(pt)
+        last = self.free_cells.pop()
+        if i < len(self.free_cells):
+            self.free_cells[i] = last
+            self.free_index[last] = i
+
+    def _give_cell(self, pt):
+        self.free_index[pt] = len(self.free_cells)
+        self.free_cells.append(pt)
         
+    # One draw out of the free cells, so it never lands on the snake
     def _place_food(self):
-        x = random.randint(0, (self.w-BLOCK_SIZE )//BLOCK_SIZE )*BLOCK_SIZE 
-        y = random.randint(0, (self.h-BLOCK_SIZE )//BLOCK_SIZE )*BLOCK_SIZE
-        self.food = Point(x, y)
-        if self.food in self.snake:
-            self._place_food()
+        if len(self.free_cells) == 0:
+            self.food = None
+            return
+        self.food = random.choice(self.free_cells)
         
     def play_step(self, action):
         self.frame_iteration += 1
@@ -92,7 +111,7 @@ class SnakeGameAI:
         
         # 2. move
         self._move(action) # update the head
-        self.snake.insert(0, self.head)
+        self.snake.appendleft(self.head)
         
         # 3. check if game over
         reward = 0
@@ -102,14 +121,19 @@ class SnakeGameAI:
             game_over = True
             reward = -10
             return reward, game_over, self.score
+        self._take_cell(self.head)
             
         # 4. place new food or just move
         if self.head == self.food:
             self.score += 1
             reward += 10
+            if len(self.free_cells) == 0:
+                # Filled the whole board, it won
+                game_over = True
+                return reward, game_over, self.score
             self._place_food()
         else:
-            self.snake.pop()
+            self._give_cell(self.snake.pop())
         
         # 5. update ui and clock
         self._update_ui()
@@ -125,7 +149,7 @@ class SnakeGameAI:
         if point.x > self.w - BLOCK_SIZE or point.x < 0 or point.y > self.h - BLOCK_SIZE or point.y < 0:
             return True
         # hits itself
-        if point in self.snake[1:]:
+        if point in islice(self.snake, 1, None):
             return True
         
         return False
@@ -1,8 +1,26 @@
+import numpy as np
+from collections import namedtuple
+from loopDetection import cellKeys, hashBody, DIRECTION_KEYS, HASH_BASE, MASK
+
+Point = namedtuple('Point', 'x, y')
+
+# Python ints so the hash math doesn't go through numpy scalars every frame
+_DIRECTION_KEYS = [int(key) for key in DIRECTION_KEYS]
+
 class Snake:
-    def __init__(self, direction, head, snake, score, food, gameOver, model):
-        self.direction = direction
+    # Fixed set of fields, no per instance __dict__, so the engines can read and write them directly on the hot path
+    # The getters and setters are still here for everything that isn't run every frame
+    __slots__ = ('direction', 'head', 'score', 'food', 'gameOver', 'model', 'frameIterations', 'death', 'finalLength',
+                 'pad', 'occupancy', 'capacity', 'body', 'bodyHead', 'length', 'rows', 'freeCells', 'freePos', 'numFree',
+                 'cellKeys', 'bodyHash', 'tailPower', 'loopHash', 'loopSteps', 'loopLimit')
+
+    # Every position (head, food, body) is an integer cell, not pixels, only drawing multiplies by BLOCK_SIZE
+    # occupancy is this snake's occupancy grid from the engine, indexed [x + pad, y + pad]
+    # The body is kept in a ring buffer big enough for the whole board, so moving never allocates anything
+    def __init__(self, direction, head, snake, score, food, gameOver, model, occupancy=None, pad=0):
+        # Clockwise index, RIGHT 0, DOWN 1, LEFT 2, UP 3, same as the engines' Direction
+        self.direction = int(direction)
         self.head = head
-        self.snake = snake
         self.score = score
         self.food = food
         self.gameOver = gameOver
@@ -12,9 +30,38 @@ class Snake:
         # 0 Lazy, didn't get any more fruit and just died bc of multiplier death
         # 1 Wall
         # 2 Hit itself
+        # 3 Won, filled the whole board
+        # 4 Still going when the generation ran out of frames or time
         self.death = None
         self.finalLength = None
-    
+
+        self.pad = pad
+        if occupancy is None:
+            # Big enough for a 1 cell board, engines always give their own grid
+            occupancy = np.ones((2 * pad + 1, 2 * pad + 1), dtype=bool)
+        self.occupancy = occupancy
+        # Board cells + 1 since the new head goes in before the tail comes out
+        self.capacity = (occupancy.shape[0] - 2 * pad) * (occupancy.shape[1] - 2 * pad) + 1
+        # Cells of the body, bodyHead is the index of the head and the tail is length - 1 slots behind it
+        self.body = np.zeros((self.capacity, 2), dtype=np.int64)
+        self.bodyHead = 0
+        self.length = 0
+        # Every empty cell as a flat index x * rows + y, the first numFree entries of freeCells are the empty ones
+        # freePos is where each cell sits in freeCells, so taking a cell out is a swap with the last empty one
+        self.rows = occupancy.shape[1] - 2 * pad
+        self.freeCells = np.arange(self.capacity - 1)
+        self.freePos = np.arange(self.capacity - 1)
+        self.numFree = self.capacity - 1
+        # Hash of the body and the state Brent's cycle detection compares against, see loopDetection
+        self.cellKeys = None
+        self.bodyHash = 0
+        self.tailPower = 1
+        self.loopHash = None
+        self.loopSteps = 0
+        self.loopLimit = 1
+        if snake is not None:
+            self.setSnake(snake)
+
     def getDirection(self):
         return self.direction
 
@@ -27,11 +74,114 @@ class Snake:
     def setHead(self, newHead):
         self.head = newHead
 
+    # Full body from head to tail in cells
+    # Builds a new list every call, so it's only meant for drawing, not the game loop
     def getSnake(self):
-        return self.snake
+        snake = []
+        for j in range(self.length):
+            x, y = self.body[(self.bodyHead - j) % self.capacity]
+            snake.append(Point(int(x), int(y)))
+        return snake
 
+    # newSnake is a list of points in cells from head to tail
     def setSnake(self, newSnake):
-        self.snake = newSnake
+        self.clearBody()
+        for point in reversed(newSnake):
+            self.pushHead(point)
+
+    # Adds a new head at point, O(1)
+    def pushHead(self, point):
+        x = point.x
+        y = point.y
+        self.bodyHead = (self.bodyHead + 1) % self.capacity
+        self.body[self.bodyHead, 0] = x
+        self.body[self.bodyHead, 1] = y
+        self.length += 1
+        self.occupancy[x + self.pad, y + self.pad] = True
+        # Swap the cell with the last empty one and shrink the empty part
+        cell = x * self.rows + y
+        pos = self.freePos[cell]
+        self.numFree -= 1
+        lastCell = self.freeCells[self.numFree]
+        self.freeCells[pos] = lastCell
+        self.freePos[lastCell] = pos
+        self.freeCells[self.numFree] = cell
+        self.freePos[cell] = self.numFree
+
+    # Removes the last segment and returns it, O(1)
+    def popTail(self):
+        x, y = self.body[(self.bodyHead - self.length + 1) % self.capacity]
+        self.length -= 1
+        self.occupancy[x + self.pad, y + self.pad] = False
+        # The cell right after the empty part is this one's new spot
+        cell = x * self.rows + y
+        pos = self.freePos[cell]
+        otherCell = self.freeCells[self.numFree]
+        self.freeCells[pos] = otherCell
+        self.freePos[otherCell] = pos
+        self.freeCells[self.numFree] = cell
+        self.freePos[cell] = self.numFree
+        self.numFree += 1
+        return Point(int(x), int(y))
+
+    # Whether point is part of the body, O(1)
+    def contains(self, point):
+        return bool(self.occupancy[point.x + self.pad, point.y + self.pad])
+
+    # Random empty cell drawn from rng in one go, None when the body covers the whole board
+    def randomFreeCell(self, rng):
+        if self.numFree == 0:
+            return None
+        cell = int(self.freeCells[rng.integers(0, self.numFree)])
+        return Point(cell // self.rows, cell % self.rows)
+
+    # Empties the body and the inside of the occupancy grid, the walls stay
+    def clearBody(self):
+        p = self.pad
+        self.occupancy[p:self.occupancy.shape[0] - p, p:self.occupancy.shape[1] - p] = False
+        self.length = 0
+        self.freeCells[:] = np.arange(self.capacity - 1)
+        self.freePos[:] = self.freeCells
+        self.numFree = self.capacity - 1
+
+    # Loop detection, the engines only call these when LOOP_DETECTION is on
+    # Hashes the current body from scratch and starts watching for a repeated state, O(length)
+    def startLoopCheck(self):
+        if self.cellKeys is None:
+            self.cellKeys = cellKeys(self.capacity - 1).tolist()
+        positions = (self.bodyHead - np.arange(self.length)) % self.capacity
+        cells = self.body[positions, 0] * self.rows + self.body[positions, 1]
+        self.bodyHash, self.tailPower = hashBody(cells, self.cellKeys)
+        self.loopHash = self.bodyHash ^ _DIRECTION_KEYS[self.direction]
+        self.loopSteps = 0
+        self.loopLimit = 1
+
+    # Updates the hash for the frame that was just played, tail is what popTail returned or None if the snake ate, O(1)
+    # Returns True when the snake is back in a state it was already in since its last food
+    def repeatsState(self, tail):
+        head = self.head
+        headKey = self.cellKeys[head.x * self.rows + head.y]
+        if tail is None:
+            # A longer snake can't be in any state it was in before, so the search starts over
+            self.bodyHash = (self.bodyHash * HASH_BASE + headKey) & MASK
+            self.tailPower = self.tailPower * HASH_BASE & MASK
+            self.loopHash = self.bodyHash ^ _DIRECTION_KEYS[self.direction]
+            self.loopSteps = 0
+            self.loopLimit = 1
+            return False
+        tailKey = self.cellKeys[tail.x * self.rows + tail.y]
+        self.bodyHash = ((self.bodyHash - tailKey * self.tailPower) * HASH_BASE + headKey) & MASK
+        state = self.bodyHash ^ _DIRECTION_KEYS[self.direction]
+        if state == self.loopHash:
+            return True
+        # Brent's method, the saved state jumps to the current one every power of 2 frames
+        # That catches a loop of any length within a couple of laps without remembering every state
+        self.loopSteps += 1
+        if self.loopSteps == self.loopLimit:
+            self.loopHash = state
+            self.loopSteps = 0
+            self.loopLimit *= 2
+        return False
 
     def getScore(self):
         return self.score
@@ -2,21 +2,24 @@
 
 import pygame
 import random
-from enum import Enum
+from enum import IntEnum
 from collections import namedtuple
 from config import *
 from Snake import Snake
+from recorder import GameReplay
 import numpy as np
 
 pygame.init()
 
 font = pygame.font.SysFont('arial', 25)
 
-class Direction(Enum):
-    RIGHT = 1
+# Clockwise order, so turning right is + 1 and turning left is - 1
+# IntEnum so the snakes can store a plain int and still compare equal to these
+class Direction(IntEnum):
+    RIGHT = 0
+    DOWN = 1
     LEFT = 2
     UP = 3
-    DOWN = 4
     
 Point = namedtuple('Point', 'x, y')
 
@@ -30,45 +33,114 @@ GREEN1 = (0, 255, 0)
 GREEN2 = (100, 255, 0)
 BLACK = (0,0,0)
 
-class SnakeGameAI:
+# How many frames the left and right arrow keys jump while playing a recording
+SEEK_FRAMES = 100
+
+class ReplaySnakeGame:
     """
     game should be in the following shape:
     type game = {
         height: number,
         width: number,
-        gameMoves: {        
+        gameMoves: Iterable<{        
                 snakeBody: Point[]
-                food: Point
-            }[]
+                food: Point | None
+            }>
     }
+    width and height are in pixels, points are in cells like the other engines
+    gameMoves only gets read one frame at a time, so it can be a generator like recorder.replayFrames
+    Moves can also have the frame number they are as 'frame'
     These are the basics variables needed 
+    To save frames without a window use offscreenRenderer, like replay.py --export does
     """    
     def __init__(self, game, s=SPEED):
-        if len(game['gameMoves']) == 0:
-            raise Exception("No game moves given")
         try:
             self.w = game['width']
             self.h = game['height']
-            self.currMove = 0
-            firstMove = game['gameMoves'][0]
-            self.snake = firstMove['snakeBody']
-            self.food = firstMove['food']
-                                
-            self.display = pygame.display.set_mode((self.w, self.h), pygame.NOFRAME)
-            pygame.display.set_caption('Snake')
-            self.clock = pygame.time.Clock()
-        except:
+            self.gameMoves = iter(game['gameMoves'])
+        except (KeyError, TypeError):
             raise Exception("Missing game data")
+        firstMove = next(self.gameMoves, None)
+        if firstMove is None:
+            raise Exception("No game moves given")
+        self.s = s
+        # Set by fromRecord, lets seek jump around the game
+        self.replay = None
+        self.currMove = 0
+        self.showMove(firstMove)
+                            
+        self.display = pygame.display.set_mode((self.w, self.h), pygame.NOFRAME)
+        pygame.display.set_caption('Snake')
+        self.clock = pygame.time.Clock()
+
+    # Plays a recorder.GameRecord, frames get worked out while it plays and start skips straight to that frame
+    @classmethod
+    def fromRecord(cls, record, cols, rows, s=SPEED, start=0):
+        replay = GameReplay(record, cols, rows)
+        game = cls({'width': cols * BLOCK_SIZE, 'height': rows * BLOCK_SIZE, 'gameMoves': replay.frames(start)}, s)
+        game.replay = replay
+        return game
+
+    def showMove(self, move):
+        self.currMove = move.get('frame', self.currMove + 1)
+        self.snake = move['snakeBody']
+        self.food = move['food']
+
+    # Moves on to the next frame, returns False once there are none left
+    def nextMove(self):
+        move = next(self.gameMoves, None)
+        if move is None:
+            return False
+        self.showMove(move)
+        return True
+
+    # Jumps to a frame of a game made with fromRecord, going back starts from the replay's closest keyframe instead of frame 0
+    # Returns False and stays put if the game ends before that frame
+    def seek(self, frame):
+        if self.replay is None:
+            raise Exception("Only recorded games can seek")
+        gameMoves = self.replay.frames(max(frame, 0))
+        move = next(gameMoves, None)
+        if move is None:
+            return False
+        self.gameMoves = gameMoves
+        self.showMove(move)
+        return True
+
+    # Shows the next frame, returns False once there are none left
+    def playStep(self):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                quit()
+            if event.type == pygame.KEYDOWN and self.replay is not None:
+                if event.key == pygame.K_LEFT:
+                    self.seek(self.currMove - SEEK_FRAMES)
+                elif event.key == pygame.K_RIGHT:
+                    self.seek(self.currMove + SEEK_FRAMES)
+        self.updateUi()
+        return self.nextMove()
+
+    # Plays every frame, the last one stays up for a second
+    # The left and right arrow keys jump SEEK_FRAMES back or ahead in recorded games
+    def play(self):
+        while self.playStep():
+            pass
+        pygame.time.wait(1000)
         
     def updateUi(self):
+        self.draw()
+        pygame.display.flip()
+        self.clock.tick(self.s)
+
+    def draw(self):
         self.display.fill(BLACK)
 
         for pt in self.snake:
-            pygame.draw.rect(self.display, BLUE1, pygame.Rect(pt.x, pt.y, BLOCK_SIZE, BLOCK_SIZE))
-            pygame.draw.rect(self.display, BLUE2, pygame.Rect(pt.x+4, pt.y+4, 12, 12))
+            pygame.draw.rect(self.display, BLUE1, pygame.Rect(pt.x*BLOCK_SIZE, pt.y*BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE))
+            pygame.draw.rect(self.display, BLUE2, pygame.Rect(pt.x*BLOCK_SIZE+4, pt.y*BLOCK_SIZE+4, 12, 12))
             
-            food = self.food
-            pygame.draw.rect(self.display, BLUE, pygame.Rect(food.x, food.y, BLOCK_SIZE, BLOCK_SIZE))
-
-        pygame.display.flip()
-        self.clock.tick(self.s)
\ No newline at end of file
+        # No food left once a snake filled the whole board
+        food = self.food
+        if food is not None:
+            pygame.draw.rect(self.display, BLUE, pygame.Rect(food.x*BLOCK_SIZE, food.y*BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE))
@@ -0,0 +1,377 @@
+### Headless engine that keeps the whole population in numpy arrays and moves every live snake in one step call
+### Game rules are the same as SnakeGameNoGUI, it just doesn't go through the snakes one at a time
+from enum import IntEnum
+from collections import namedtuple
+from config import *
+from SnakeGames.kernels import stepKernel, NUMBA_AVAILABLE
+from seeding import snakeRngs
+from loopDetection import cellKeys, hashBody, DIRECTION_KEYS, HASH_BASE
+import numpy as np
+
+# Same clockwise values as the other engines, directions are stored as these ints
+class Direction(IntEnum):
+    RIGHT = 0
+    DOWN = 1
+    LEFT = 2
+    UP = 3
+
+Point = namedtuple('Point', 'x, y')
+
+# How many cells the head moves on x and y for each of the clockwise directions
+DIRECTION_DELTAS = np.array([[1, 0], [0, 1], [-1, 0], [0, -1]], dtype=np.int64)
+# Action index -> change in clockwise index
+# 0 straight, 1 right turn (clockwise), 2 left turn (counter clockwise)
+ACTION_TURNS = np.array([0, 1, -1], dtype=np.int64)
+
+class SnakeGameBatched:
+    # useKernel swaps step for the compiled numba kernel, the results are exactly the same
+    # seed gives every snake the same food stream the other engines would give it, so the games match them exactly
+    def __init__(self, numSnakes, w=WIDTH, h=HEIGHT, seed=None, useKernel=False):
+        if useKernel and not NUMBA_AVAILABLE:
+            raise Exception("The compiled step kernel needs numba installed")
+        self.useKernel = useKernel
+        self.w = w
+        self.h = h
+        self.numSnakes = numSnakes
+        self.cols = w // BLOCK_SIZE
+        self.rows = h // BLOCK_SIZE
+        self.seed = seed
+        self.rngs = snakeRngs(seed, 0, range(numSnakes))
+        # Grids get padded with walls so that head + 1 and the vision window never index out of bounds
+        self.pad = max(SNAKE_VISION_RADIUS, 1)
+        # Enough room for a snake that fills the whole board, plus the new head before the tail is popped
+        self.capacity = self.cols * self.rows + 1
+
+        # Everything is stored in cell coordinates, not pixels
+        self.heads = np.zeros((numSnakes, 2), dtype=np.int64)
+        self.directions = np.zeros(numSnakes, dtype=np.int64)
+        self.food = np.zeros((numSnakes, 2), dtype=np.int64)
+        self.gameOver = np.zeros(numSnakes, dtype=bool)
+        self.frameIterations = np.zeros(numSnakes, dtype=np.int64)
+        self.scores = np.zeros(numSnakes, dtype=np.int64)
+        self.lengths = np.zeros(numSnakes, dtype=np.int64)
+        self.finalLengths = np.zeros(numSnakes, dtype=np.int64)
+        # Same death codes as Snake, -1 means it hasn't died yet
+        self.deaths = np.full(numSnakes, -1, dtype=np.int64)
+        # Body of every snake as a ring buffer, headPtr points at the head and tailPtr at the last segment
+        self.body = np.zeros((numSnakes, self.capacity, 2), dtype=np.int64)
+        self.headPtr = np.zeros(numSnakes, dtype=np.int64)
+        self.tailPtr = np.zeros(numSnakes, dtype=np.int64)
+        # Occupancy grid indexed [snake, x + pad, y + pad], True for walls and body segments
+        self.grid = np.ones((numSnakes, self.cols + 2 * self.pad, self.rows + 2 * self.pad), dtype=bool)
+        # Empty cells of every snake as flat indices x * rows + y, same layout as Snake
+        # The first numFree entries of each freeCells row are the empty ones, freePos is where each cell sits in its row
+        self.numCells = self.cols * self.rows
+        self.freeCells = np.zeros((numSnakes, self.numCells), dtype=np.int64)
+        self.freePos = np.zeros((numSnakes, self.numCells), dtype=np.int64)
+        self.numFree = np.zeros(numSnakes, dtype=np.int64)
+        self.models = [None] * numSnakes
+        # Indices of the snakes that are still playing, it only ever shrinks during a generation
+        # Every step only looks at these, so the dead snakes don't cost anything
+        self.aliveIdx = np.arange(numSnakes)
+        # Which snakes the kernel says need new food
+        self.ate = np.zeros(numSnakes, dtype=bool)
+        # GameRecorder that gets every move and food cell when set
+        self.recorder = None
+        # Loop detection state, same as the fields in Snake but as uint64 arrays that wrap around on their own
+        self.cellKeys = cellKeys(self.numCells)
+        self.bodyHash = np.zeros(numSnakes, dtype=np.uint64)
+        self.tailPower = np.ones(numSnakes, dtype=np.uint64)
+        self.loopHash = np.zeros(numSnakes, dtype=np.uint64)
+        self.loopSteps = np.zeros(numSnakes, dtype=np.int64)
+        self.loopLimit = np.ones(numSnakes, dtype=np.int64)
+
+    def getSnake(self, i):
+        return SnakeView(self, i)
+
+    # Inner part of the grid, without the wall padding
+    def _board(self):
+        p = self.pad
+        return self.grid[:, p:p + self.cols, p:p + self.rows]
+
+    # init game state
+    # snakeOffset is the population index of snake 0, for when this game only plays a slice of the population
+    def reset(self, models, generation=0, snakeOffset=0):
+        if len(models) != self.numSnakes:
+            # Just in case I forget
+            raise Exception("Number of models given does not match number of snakes")
+        self.rngs = snakeRngs(self.seed, generation, range(snakeOffset, snakeOffset + self.numSnakes))
+
+        self.models = list(models)
+        startX = int(self.w / 2) // BLOCK_SIZE
+        startY = int(self.h / 2) // BLOCK_SIZE
+        self.heads[:] = (startX, startY)
+        self.directions[:] = Direction.RIGHT
+        self.gameOver[:] = False
+        self.frameIterations[:] = 0
+        self.scores[:] = 0
+        self.lengths[:] = 3
+        self.finalLengths[:] = 0
+        self.deaths[:] = -1
+        self.aliveIdx = np.arange(self.numSnakes)
+
+        # Tail is at index 0, head at index 2, same starting body as the other engines
+        self.body[:, 0] = (startX - 2, startY)
+        self.body[:, 1] = (startX - 1, startY)
+        self.body[:, 2] = (startX, startY)
+        self.tailPtr[:] = 0
+        self.headPtr[:] = 2
+
+        board = self._board()
+        board[:] = False
+        board[:, startX - 2:startX + 1, startY] = True
+
+        # Taken out tail first, same order Snake.setSnake pushes them in, so the empty cells end up in the same order
+        allIdx = np.arange(self.numSnakes)
+        self.freeCells[:] = np.arange(self.numCells)
+        self.freePos[:] = np.arange(self.numCells)
+        self.numFree[:] = self.numCells
+        for x in range(startX - 2, startX + 1):
+            self._takeCells(allIdx, np.full(self.numSnakes, x * self.rows + startY))
+
+        if self.recorder is not None:
+            self.recorder.startGeneration(self.numSnakes, [x * self.rows + startY for x in range(startX, startX - 3, -1)], Direction.RIGHT)
+        self._placeFood(allIdx)
+        if LOOP_DETECTION:
+            # Every snake starts with the same body, head first
+            startCells = [x * self.rows + startY for x in range(startX, startX - 3, -1)]
+            bodyHash, tailPower = hashBody(startCells, self.cellKeys)
+            self.bodyHash[:] = bodyHash
+            self.tailPower[:] = tailPower
+            self.loopHash[:] = self.bodyHash ^ DIRECTION_KEYS[self.directions]
+            self.loopSteps[:] = 0
+            self.loopLimit[:] = 1
+
+    # Takes cells[k] out of snake idx[k]'s empty cells by swapping it with the last empty one, idx can't repeat
+    def _takeCells(self, idx, cells):
+        pos = self.freePos[idx, cells]
+        self.numFree[idx] -= 1
+        last = self.numFree[idx]
+        lastCells = self.freeCells[idx, last]
+        self.freeCells[idx, pos] = lastCells
+        self.freePos[idx, lastCells] = pos
+        self.freeCells[idx, last] = cells
+        self.freePos[idx, cells] = last
+
+    # Puts cells[k] back into snake idx[k]'s empty cells, swapping it with the one right after the last empty one
+    def _returnCells(self, idx, cells):
+        pos = self.freePos[idx, cells]
+        first = self.numFree[idx]
+        otherCells = self.freeCells[idx, first]
+        self.freeCells[idx, pos] = otherCells
+        self.freePos[idx, otherCells] = pos
+        self.freeCells[idx, first] = cells
+        self.freePos[idx, cells] = first
+        self.numFree[idx] += 1
+
+    def _placeFood(self, idx):
+        # One draw out of each snake's empty cells from its own stream, same as Snake.randomFreeCell
+        # Only snakes that just ate get here, so looping over them is cheap
+        for i in idx:
+            cell = self.freeCells[i, self.rngs[i].integers(0, self.numFree[i])]
+            self.food[i] = divmod(cell, self.rows)
+            if self.recorder is not None:
+                self.recorder.logFood(i, cell)
+
+    # Snakes in idx just ate, the ones that filled the whole board win and the rest get new food
+    def _feed(self, idx):
+        won = self.numFree[idx] == 0
+        if won.any():
+            wonIdx = idx[won]
+            self.gameOver[wonIdx] = True
+            self.finalLengths[wonIdx] = self.lengths[wonIdx]
+            self.deaths[wonIdx] = 3
+            self._board()[wonIdx] = False
+        self._placeFood(idx[~won])
+
+    # actions holds an action index per snake, 0 straight, 1 right, 2 left
+    # Only snakes that are still alive get moved, anything in actions for dead snakes is ignored
+    def step(self, actions):
+        idx = self.aliveIdx
+        if idx.size == 0:
+            return
+        if self.recorder is not None:
+            self.recorder.logMoves(actions)
+        if self.useKernel:
+            self._stepKernel(actions, idx)
+        else:
+            self._stepArrays(actions, idx)
+        # Drop the ones that died this frame
+        self.aliveIdx = idx[~self.gameOver[idx]]
+
+    # numpy version of the step for the snakes in idx
+    def _stepArrays(self, actions, idx):
+        actions = np.asarray(actions)
+        p = self.pad
+        self.frameIterations[idx] += 1
+
+        # 1. move
+        newDirections = (self.directions[idx] + ACTION_TURNS[actions[idx]]) % 4
+        self.directions[idx] = newDirections
+        newHeads = self.heads[idx] + DIRECTION_DELTAS[newDirections]
+        x = newHeads[:, 0]
+        y = newHeads[:, 1]
+
+        # 2. check if game over
+        # The tail hasn't been popped yet, so running into the current tail counts as hitting itself like in the other engines
+        hitWall = (x < 0) | (x >= self.cols) | (y < 0) | (y >= self.rows)
+        hitSelf = self.grid[idx, x + p, y + p] & ~hitWall
+        # Length + 1 since the new head is already part of the snake at this point
+        lazy = self.frameIterations[idx] > AMOUNT_OF_FRAMES_TO_DEATH_MULTIPLIER * (self.lengths[idx] + 1)
+        dead = hitWall | hitSelf | lazy
+        if dead.any():
+            deadIdx = idx[dead]
+            self.gameOver[deadIdx] = True
+            self.finalLengths[deadIdx] = self.lengths[deadIdx] + 1
+            # Lazy takes priority, same as the other engines overwriting the death after isCollision
+            self.deaths[deadIdx] = np.where(lazy[dead], 0, np.where(hitWall[dead], 1, 2))
+            self._board()[deadIdx] = False
+
+        alive = ~dead
+        liveIdx = idx[alive]
+        if liveIdx.size == 0:
+            return
+        liveHeads = newHeads[alive]
+        self.heads[liveIdx] = liveHeads
+        self.headPtr[liveIdx] = (self.headPtr[liveIdx] + 1) % self.capacity
+        self.body[liveIdx, self.headPtr[liveIdx]] = liveHeads
+        self.grid[liveIdx, liveHeads[:, 0] + p, liveHeads[:, 1] + p] = True
+        self._takeCells(liveIdx, liveHeads[:, 0] * self.rows + liveHeads[:, 1])
+
+        # 3. place new food or just move
+        ate = (liveHeads == self.food[liveIdx]).all(axis=1)
+        movedIdx = liveIdx[~ate]
+        tails = self.body[movedIdx, self.tailPtr[movedIdx]]
+        self.grid[movedIdx, tails[:, 0] + p, tails[:, 1] + p] = False
+        self._returnCells(movedIdx, tails[:, 0] * self.rows + tails[:, 1])
+        self.tailPtr[movedIdx] = (self.tailPtr[movedIdx] + 1) % self.capacity
+
+        grewIdx = liveIdx[ate]
+        if grewIdx.size > 0:
+            self.scores[grewIdx] += 1
+            self.lengths[grewIdx] += 1
+            self._feed(grewIdx)
+
+        if LOOP_DETECTION:
+            self._checkLoops(movedIdx, tails, grewIdx)
+
+    # Same as Snake.repeatsState for every snake that just moved, movedIdx lost the cells in tails and grewIdx ate
+    def _checkLoops(self, movedIdx, tails, grewIdx):
+        heads = self.heads[grewIdx]
+        self.bodyHash[grewIdx] = self.bodyHash[grewIdx] * HASH_BASE + self.cellKeys[heads[:, 0] * self.rows + heads[:, 1]]
+        self.tailPower[grewIdx] *= HASH_BASE
+        self.loopHash[grewIdx] = self.bodyHash[grewIdx] ^ DIRECTION_KEYS[self.directions[grewIdx]]
+        self.loopSteps[grewIdx] = 0
+        self.loopLimit[grewIdx] = 1
+
+        heads = self.heads[movedIdx]
+        tailKeys = self.cellKeys[tails[:, 0] * self.rows + tails[:, 1]]
+        headKeys = self.cellKeys[heads[:, 0] * self.rows + heads[:, 1]]
+        bodyHash = (self.bodyHash[movedIdx] - tailKeys * self.tailPower[movedIdx]) * HASH_BASE + headKeys
+        self.bodyHash[movedIdx] = bodyHash
+        states = bodyHash ^ DIRECTION_KEYS[self.directions[movedIdx]]
+        looped = states == self.loopHash[movedIdx]
+        if looped.any():
+            loopedIdx = movedIdx[looped]
+            self.gameOver[loopedIdx] = True
+            self.finalLengths[loopedIdx] = self.lengths[loopedIdx] + 1
+            self.deaths[loopedIdx] = 0
+            self._board()[loopedIdx] = False
+
+        # Brent's method, the saved state jumps to the current one every power of 2 frames
+        watchIdx = movedIdx[~looped]
+        self.loopSteps[watchIdx] += 1
+        save = self.loopSteps[watchIdx] == self.loopLimit[watchIdx]
+        saveIdx = watchIdx[save]
+        self.loopHash[saveIdx] = states[~looped][save]
+        self.loopSteps[saveIdx] = 0
+        self.loopLimit[saveIdx] *= 2
+
+    # Ends every game that's still going, for when the generation runs out of frames or time
+    # Those snakes keep what they've done so far, see DEATH_MULTIPLIERS
+    def stopGames(self):
+        idx = self.aliveIdx
+        self.gameOver[idx] = True
+        self.finalLengths[idx] = self.lengths[idx]
+        self.deaths[idx] = 4
+        self._board()[idx] = False
+        self.aliveIdx = idx[:0]
+
+    def _stepKernel(self, actions, idx):
+        actions = np.asarray(actions, dtype=np.int64)
+        stepKernel(actions, idx, self.heads, self.directions, self.food, self.gameOver, self.frameIterations, self.scores,
+                   self.lengths, self.finalLengths, self.deaths, self.body, self.headPtr, self.tailPtr, self.grid,
+                   self.freeCells, self.freePos, self.numFree, self.cols, self.rows, self.pad, self.capacity,
+                   AMOUNT_OF_FRAMES_TO_DEATH_MULTIPLIER, self.ate, LOOP_DETECTION, self.cellKeys, DIRECTION_KEYS,
+                   np.uint64(HASH_BASE), self.bodyHash, self.tailPower, self.loopHash, self.loopSteps, self.loopLimit)
+        grewIdx = idx[self.ate[idx]]
+        if grewIdx.size > 0:
+            self._feed(grewIdx)
+
+    # Same as the other engines, point is in cells and the head itself doesn't count as a collision
+    def isCollision(self, i, point=None):
+        if point == None:
+            point = self.getSnake(i).getHead()
+        x = point.x
+        y = point.y
+        # hits boundary
+        if x >= self.cols or x < 0 or y >= self.rows or y < 0:
+            return True
+        # hits itself
+        if self.gameOver[i]:
+            return False
+        return bool(self.grid[i, x + self.pad, y + self.pad]) and (x, y) != tuple(self.heads[i])
+
+    # Body from head to tail in cell coordinates
+    def getBodyCells(self, i):
+        length = self.lengths[i]
+        positions = (self.headPtr[i] - np.arange(length)) % self.capacity
+        return self.body[i, positions]
+
+# Read only view of one snake in SnakeGameBatched so code written against Snake (fitness, UI, getState) keeps working
+class SnakeView:
+    def __init__(self, game, i):
+        self.game = game
+        self.i = i
+
+    def getDirection(self):
+        return int(self.game.directions[self.i])
+
+    def getHead(self):
+        if self.game.gameOver[self.i]:
+            return None
+        x, y = self.game.heads[self.i]
+        return Point(int(x), int(y))
+
+    def getSnake(self):
+        if self.game.gameOver[self.i]:
+            return []
+        return [Point(int(x), int(y)) for x, y in self.game.getBodyCells(self.i)]
+
+    def getScore(self):
+        return int(self.game.scores[self.i])
+
+    def getFood(self):
+        x, y = self.game.food[self.i]
+        return Point(int(x), int(y))
+
+    def getGameOver(self):
+        return bool(self.game.gameOver[self.i])
+
+    def getModel(self):
+        return self.game.models[self.i]
+
+    def setModel(self, newModel):
+        self.game.models[self.i] = newModel
+
+    def getFrameIterations(self):
+        return int(self.game.frameIterations[self.i])
+
+    def getDeath(self):
+        death = int(self.game.deaths[self.i])
+        return None if death < 0 else death
+
+    def getFinalLength(self):
+        if not self.game.gameOver[self.i]:
+            return None
+        return int(self.game.finalLengths[self.i])
@@ -1,24 +1,42 @@
 ### Original Code from https://github.com/patrickloeber/python-fun/tree/master/snake-pygame
-import random
-from enum import Enum
+from enum import IntEnum
 from collections import namedtuple
 from config import *
 from Snake import Snake
+from seeding import snakeRngs
 import numpy as np
 
-class Direction(Enum):
-    RIGHT = 1
+# Clockwise order, so turning right is + 1 and turning left is - 1
+# IntEnum so the snakes can store a plain int and still compare equal to these
+class Direction(IntEnum):
+    RIGHT = 0
+    DOWN = 1
     LEFT = 2
     UP = 3
-    DOWN = 4
     
 Point = namedtuple('Point', 'x, y')
 
+# Positions are in cells, x to the right and y down, pixels only show up when drawing
+# How many cells the head moves on x and y for each direction
+DIRECTION_DX = [1, 0, -1, 0]
+DIRECTION_DY = [0, 1, 0, -1]
+# Action index -> what playStep takes, 0 straight, 1 right, 2 left
+ACTION_MOVES = [[1, 0, 0], [0, 1, 0], [0, 0, 1]]
+
 class SnakeGameNoGUI:
-    def __init__(self, numSnakes, w=WIDTH, h=HEIGHT):
+    # seed makes every game reproducible, each snake gets its own food stream per generation
+    def __init__(self, numSnakes, w=WIDTH, h=HEIGHT, seed=None):
         self.w = w
         self.h = h
         self.numSnakes = numSnakes
+        self.seed = seed
+        self.rngs = snakeRngs(seed, 0, range(numSnakes))
+        self.cols = w // BLOCK_SIZE
+        self.rows = h // BLOCK_SIZE
+        # Occupancy grid for each snake indexed [snake, x + pad, y + pad], True for walls and body segments
+        # The walls around the board are as thick as the vision radius so the vision window can be sliced straight out of it
+        self.pad = max(SNAKE_VISION_RADIUS, 1)
+        self.grid = np.ones((numSnakes, self.cols + 2 * self.pad, self.rows + 2 * self.pad), dtype=bool)
         self.snakes = []
         for i in range(numSnakes):
             newSnake = Snake(Direction.RIGHT,  # Direction
@@ -27,94 +45,145 @@ class SnakeGameNoGUI:
                               0,                # Score
                               None,             # Food
                               False,            # Game over, false by default
-                              None)             # Neural network model, none by default
+                              None,             # Neural network model, none by default
+                              self.grid[i],     # This snake's occupancy grid, kept up to date by the snake itself
+                              self.pad)
             self.snakes.append(newSnake)
+        # Indices of the snakes that are still playing, step drops the ones that die so it never looks at them again
+        self.aliveIdx = list(range(numSnakes))
+        # GameRecorder that gets every move and food cell when set
+        self.recorder = None
 
     def getSnake(self, i):
         return self.snakes[i]
 
     # init game state
-    def reset(self, models):
+    # generation picks the food streams, so replaying a generation with the same seed gives the same games
+    def reset(self, models, generation=0):
         if len(models) != self.numSnakes:
             # Just in case I forget
             raise Exception("Number of models given does not match number of snakes")
+        self.rngs = snakeRngs(self.seed, generation, range(self.numSnakes))
+        self.aliveIdx = list(range(self.numSnakes))
+        if self.recorder is not None:
+            startX = int(self.w/2) // BLOCK_SIZE
+            startY = int(self.h/2) // BLOCK_SIZE
+            self.recorder.startGeneration(self.numSnakes, [x * self.rows + startY for x in range(startX, startX - 3, -1)], Direction.RIGHT)
         
         for i in range(self.numSnakes):
             # Not sure if doing something like snake = self.snakes[i] would be reference, but it should be since its a class reference
             currSnake = self.snakes[i]
-            currSnake.setDirection(Direction.RIGHT)
+            currSnake.direction = Direction.RIGHT.value
             
-            currSnake.setHead(Point(self.w/2, self.h/2))
+            currSnake.setHead(Point(int(self.w/2) // BLOCK_SIZE, int(self.h/2) // BLOCK_SIZE))
             # This should also be fine
             currHead = currSnake.getHead()
             currSnake.setSnake([currHead, 
-                                Point(currHead.x-BLOCK_SIZE, currHead.y),
-                                Point(currHead.x-(2*BLOCK_SIZE), currHead.y)])
+                                Point(currHead.x-1, currHead.y),
+                                Point(currHead.x-2, currHead.y)])
             currSnake.setScore(0)
             currSnake.setFood(None)
             self._placeFood(i)
             currSnake.setModel(models[i])
             currSnake.setGameOver(False)
             currSnake.setFrameIterations(0)
+            currSnake.setDeath(None)
+            if LOOP_DETECTION:
+                currSnake.startLoopCheck()
             # Just in case
             self.snakes[i] = currSnake
         
     def _placeFood(self, i):
         currSnake = self.snakes[i]
-        x = random.randint(0, (self.w-BLOCK_SIZE) // BLOCK_SIZE) * BLOCK_SIZE 
-        y = random.randint(0, (self.h-BLOCK_SIZE) // BLOCK_SIZE) * BLOCK_SIZE
-        food = Point(x, y)
-        if food in currSnake.getSnake():
-            self._placeFood(i)
-        else:
-            currSnake.setFood(food)
+        # One draw out of the snake's empty cells, it can't land on the body so there's nothing to retry
+        currSnake.food = currSnake.randomFreeCell(self.rngs[i])
+        if self.recorder is not None and currSnake.food is not None:
+            self.recorder.logFood(i, currSnake.food.x * self.rows + currSnake.food.y)
 
     def playStep(self, action, i):
         currSnake = self.snakes[i]
-        currSnake.setFrameIterations(currSnake.getFrameIterations() + 1)
+        currSnake.frameIterations += 1
 
         # 1. move
         self._move(action, i) # update the head
-        # Insert the head at index 0
-        # Removing the last element if no food was picked up is handled next
-        currSnake.setSnake([currSnake.getHead()] + currSnake.getSnake())
+        # The new head only goes into the body once it's known the snake survived
 
         # 2. check if game over
         # If snake collides or it doesnt do anything for too long, end game
-        if currSnake.getSnake() != None and self.isCollision(i) or currSnake.getFrameIterations() > AMOUNT_OF_FRAMES_TO_DEATH_MULTIPLIER * len(currSnake.getSnake()):
-            currSnake.setGameOver(True)
-            currSnake.setFinalLength(len(currSnake.getSnake()))
-            currSnake.setSnake([])
-            currSnake.setHead(None)
-            if currSnake.getFrameIterations() > AMOUNT_OF_FRAMES_TO_DEATH_MULTIPLIER * currSnake.getFinalLength():
+        # Length + 1 to count the new head
+        if self.isCollision(i) or currSnake.frameIterations > AMOUNT_OF_FRAMES_TO_DEATH_MULTIPLIER * (currSnake.length + 1):
+            currSnake.gameOver = True
+            currSnake.finalLength = currSnake.length + 1
+            currSnake.clearBody()
+            currSnake.head = None
+            if currSnake.frameIterations > AMOUNT_OF_FRAMES_TO_DEATH_MULTIPLIER * currSnake.finalLength:
                 # Lazy death
-                currSnake.setDeath(0)
+                currSnake.death = 0
+            return
+        currSnake.pushHead(currSnake.head)
 
         # 3. place new food or just move
-        if currSnake.getHead() == currSnake.getFood():
-            currSnake.setScore(currSnake.getScore() + 1)
+        if currSnake.head == currSnake.food:
+            currSnake.score += 1
+            if currSnake.numFree == 0:
+                # Filled the whole board, there's nowhere left to put food
+                currSnake.gameOver = True
+                currSnake.finalLength = currSnake.length
+                currSnake.clearBody()
+                currSnake.head = None
+                currSnake.death = 3
+                return
             self._placeFood(i)
+            if LOOP_DETECTION:
+                currSnake.repeatsState(None)
         else:
-            newSnake = currSnake.getSnake()
-            if newSnake is None or len(newSnake) == 0:
-                return
-            newSnake.pop()
-            currSnake.setSnake(newSnake)
+            tail = currSnake.popTail()
+            if LOOP_DETECTION and currSnake.repeatsState(tail):
+                # Back in a state it was already in with the same food, it would only go around until the timeout
+                # Ends the same way the timeout would, just sooner
+                currSnake.gameOver = True
+                currSnake.finalLength = currSnake.length + 1
+                currSnake.clearBody()
+                currSnake.head = None
+                currSnake.death = 0
+
+    # Plays a frame for every snake that's still alive, actions holds an action index per snake like SnakeGameBatched.step
+    def step(self, actions):
+        if self.recorder is not None:
+            self.recorder.logMoves(actions)
+        snakes = self.snakes
+        for i in self.aliveIdx:
+            self.playStep(ACTION_MOVES[actions[i]], i)
+        self.aliveIdx = [i for i in self.aliveIdx if not snakes[i].gameOver]
+
+    # Ends every game that's still going, for when the generation runs out of frames or time
+    # Those snakes keep what they've done so far, see DEATH_MULTIPLIERS
+    def stopGames(self):
+        for i in self.aliveIdx:
+            currSnake = self.snakes[i]
+            currSnake.gameOver = True
+            currSnake.finalLength = currSnake.length
+            currSnake.clearBody()
+            currSnake.head = None
+            currSnake.death = 4
+        self.aliveIdx = []
     
     def isCollision(self, i, point=None):
         currSnake = self.snakes[i]
         # If there's no given point to check collision for, use the head
-        if point == None:
-            point = currSnake.getHead()
+        # playStep checks the new head before it is pushed onto the body, so the grid is exactly the rest of the body
+        checkingHead = point == None
+        if checkingHead:
+            point = currSnake.head
         # hits boundary
-        if point.x > self.w - BLOCK_SIZE or point.x < 0 or point.y > self.h - BLOCK_SIZE or point.y < 0:
+        if point.x >= self.cols or point.x < 0 or point.y >= self.rows or point.y < 0:
             # Hit the wall
-            currSnake.setDeath(1)
+            currSnake.death = 1
             return True
         # hits itself
-        elif currSnake.getSnake() is not None and len(currSnake.getSnake()) > 0 and point in currSnake.getSnake()[1:]:
+        elif currSnake.contains(point) and (checkingHead or point != currSnake.head):
             # Hit itself
-            currSnake.setDeath(2)
+            currSnake.death = 2
             return True
         
         return False
@@ -122,32 +191,17 @@ class SnakeGameNoGUI:
     def _move(self, action, i):
         currSnake = self.snakes[i]
         # straight, right, left
-        clockwise = [Direction.RIGHT, Direction.DOWN, Direction.LEFT, Direction.UP]
-        idx = clockwise.index(currSnake.getDirection())
+        # Directions are clockwise, so a right turn is + 1 and a left turn is - 1
         # 1, 0, 0 go straight, no direction change
-        if np.array_equal(action, [1, 0, 0]):
-            newDir = clockwise[idx]
+        if action[0] == 1:
+            newDir = currSnake.direction
         # 0, 1, 0 make a right turn, clockwise turn
-        elif np.array_equal(action, [0, 1, 0]):
-            nextIdx = (idx + 1) % 4
-            newDir = clockwise[nextIdx]
+        elif action[1] == 1:
+            newDir = (currSnake.direction + 1) % 4
         # 0, 0, 1 make a left turn, counter clockwise turn
-        # np.array_equal(action, [0, 0, 1])
         else:
-            nextIdx = (idx - 1) % 4
-            newDir = clockwise[nextIdx]
+            newDir = (currSnake.direction - 1) % 4
         
-        currSnake.setDirection(newDir)
-        currHead = currSnake.getHead()
-        x = currHead.x
-        y = currHead.y
-        if newDir == Direction.RIGHT:
-            x += BLOCK_SIZE
-        elif newDir == Direction.LEFT:
-            x -= BLOCK_SIZE
-        elif newDir == Direction.DOWN:
-            y += BLOCK_SIZE
-        elif newDir == Direction.UP:
-            y -= BLOCK_SIZE
-            
-        currSnake.setHead(Point(x, y))
+        currSnake.direction = newDir
+        currHead = currSnake.head
+        currSnake.head = Point(currHead.x + DIRECTION_DX[newDir], currHead.y + DIRECTION_DY[newDir])
@@ -0,0 +1,118 @@
+### Compiled version of SnakeGameBatched.step for the big sweeps
+### Numba is optional, SnakeGameBatched's numpy step stays the reference and this has to match it exactly
+### Without numba the kernel doesn't get compiled and SnakeGameBatched won't take useKernel, the numpy step gets used instead
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Moves every snake in aliveIdx one frame, same rules and order of checks as SnakeGameBatched.step
+# Food isn't placed here, ate gets set for every snake that ate so the engine can draw the food (or end the game on a win) with its own rng
+# That keeps the random numbers, and so the whole trajectory, identical to the numpy step
+# With checkLoops the state hashes get updated the same way as SnakeGameBatched._checkLoops, everything hash related is uint64 so it wraps instead of turning into floats
+def stepKernel(actions, aliveIdx, heads, directions, food, gameOver, frameIterations, scores, lengths, finalLengths, deaths,
+               body, headPtr, tailPtr, grid, freeCells, freePos, numFree, cols, rows, pad, capacity, frameMultiplier, ate,
+               checkLoops, cellKeys, directionKeys, hashBase, bodyHash, tailPower, loopHash, loopSteps, loopLimit):
+    for k in range(aliveIdx.shape[0]):
+        i = aliveIdx[k]
+        ate[i] = False
+        frameIterations[i] += 1
+
+        # 1. move, directions are clockwise RIGHT, DOWN, LEFT, UP
+        action = actions[i]
+        direction = directions[i]
+        if action == 1:
+            direction = (direction + 1) % 4
+        elif action == 2:
+            direction = (direction + 3) % 4
+        directions[i] = direction
+        x = heads[i, 0]
+        y = heads[i, 1]
+        if direction == 0:
+            x += 1
+        elif direction == 1:
+            y += 1
+        elif direction == 2:
+            x -= 1
+        else:
+            y -= 1
+
+        # 2. check if game over
+        hitWall = x < 0 or x >= cols or y < 0 or y >= rows
+        hitSelf = (not hitWall) and grid[i, x + pad, y + pad]
+        lazy = frameIterations[i] > frameMultiplier * (lengths[i] + 1)
+        if hitWall or hitSelf or lazy:
+            gameOver[i] = True
+            finalLengths[i] = lengths[i] + 1
+            if lazy:
+                deaths[i] = 0
+            elif hitWall:
+                deaths[i] = 1
+            else:
+                deaths[i] = 2
+            grid[i, pad:pad + cols, pad:pad + rows] = False
+            continue
+
+        heads[i, 0] = x
+        heads[i, 1] = y
+        headPtr[i] = (headPtr[i] + 1) % capacity
+        body[i, headPtr[i], 0] = x
+        body[i, headPtr[i], 1] = y
+        grid[i, x + pad, y + pad] = True
+        # Swap the head's cell out of the empty cells
+        cell = x * rows + y
+        pos = freePos[i, cell]
+        numFree[i] -= 1
+        last = numFree[i]
+        lastCell = freeCells[i, last]
+        freeCells[i, pos] = lastCell
+        freePos[i, lastCell] = pos
+        freeCells[i, last] = cell
+        freePos[i, cell] = last
+
+        # 3. grow or just move
+        if x == food[i, 0] and y == food[i, 1]:
+            scores[i] += 1
+            lengths[i] += 1
+            ate[i] = True
+            if checkLoops:
+                bodyHash[i] = bodyHash[i] * hashBase + cellKeys[cell]
+                tailPower[i] = tailPower[i] * hashBase
+                loopHash[i] = bodyHash[i] ^ directionKeys[direction]
+                loopSteps[i] = 0
+                loopLimit[i] = 1
+        else:
+            tail = tailPtr[i]
+            grid[i, body[i, tail, 0] + pad, body[i, tail, 1] + pad] = False
+            # Swap the tail's cell back in right after the last empty one
+            cell = body[i, tail, 0] * rows + body[i, tail, 1]
+            pos = freePos[i, cell]
+            first = numFree[i]
+            otherCell = freeCells[i, first]
+            freeCells[i, pos] = otherCell
+            freePos[i, otherCell] = pos
+            freeCells[i, first] = cell
+            freePos[i, cell] = first
+            numFree[i] += 1
+            tailPtr[i] = (tail + 1) % capacity
+
+            if checkLoops:
+                # cell is the tail's here, the head's key is looked up again
+                bodyHash[i] = (bodyHash[i] - cellKeys[cell] * tailPower[i]) * hashBase + cellKeys[x * rows + y]
+                state = bodyHash[i] ^ directionKeys[direction]
+                if state == loopHash[i]:
+                    gameOver[i] = True
+                    finalLengths[i] = lengths[i] + 1
+                    deaths[i] = 0
+                    grid[i, pad:pad + cols, pad:pad + rows] = False
+                    continue
+                loopSteps[i] += 1
+                if loopSteps[i] == loopLimit[i]:
+                    loopHash[i] = state
+                    loopSteps[i] = 0
+                    loopLimit[i] *= 2
+
+if NUMBA_AVAILABLE:
+    stepKernel = njit(cache=True)(stepKernel)
@@ -1,8 +1,16 @@
 import torch
 import numpy as np
-from SnakeGames.SnakeGame import SnakeGameAI, Direction, Point, BLOCK_SIZE
+from SnakeGames.SnakeGame import SnakeGameAI, Direction
 from SnakeGames.SnakeGameNoGUI import SnakeGameNoGUI
-from model import EvolutionNetwork, averageCrossover, mutateModel
+from SnakeGames.SnakeGameBatched import SnakeGameBatched
+from model import EvolutionNetwork, Population
+from encoder import StateEncoder
+from fitness import computeFitness
+from parallel import ParallelEvaluator
+from profiling import PhaseTimer, formatPhases
+from metrics import MetricsWriter, generationMetrics
+from checkpoint import saveCheckpoint, loadCheckpoint, encodeState, decodeState, CheckpointWriter
+from recorder import GameRecorder, TrajectoryWriter
 from config import *
 import time
 from threading import Thread
@@ -11,88 +19,154 @@ import os
 # Agent class used to manage the game and AI
 class Agent:
     # TODO look at this one
-    def __init__(self, numSnakes, modelLoadName=None):
+    # seed makes the starting weights, every generation's games and every evolution step reproducible
+    # metricsPath is a .jsonl or .csv file that gets a record of every generation appended to it
+    # checkpointName turns on checkpoints during training, saved in the background as model/checkpointName-<generation>.ckpt and model/checkpointName-best.ckpt
+    # recordPath is a file the games of every generation's RECORD_TOP_SNAKES fittest snakes get appended to, watch them with replay.py
+    # The rest default to config, they're only given to run something else without touching it, like the benchmarks do
+    def __init__(self, numSnakes, modelLoadName=None, seed=None, metricsPath=None, checkpointName=None, recordPath=None, showGame=SHOW_GAME, backend=GAME_BACKEND, workers=PARALLEL_WORKERS, w=WIDTH, h=HEIGHT):
         self.numSnakes = numSnakes
-        if SHOW_GAME:
-            self.game = SnakeGameAI(numSnakes)
-        else:
-            self.game = SnakeGameNoGUI(numSnakes)
+        self.seed = seed
+        self.showGame = showGame
+        if backend not in ("batched", "numba", "python"):
+            raise Exception(f"Unknown game backend {backend}")
+        # Headless runs can spread each generation over a pool of processes
+        self.evaluator = None
+        if workers > 0 and not showGame:
+            self.evaluator = ParallelEvaluator(numSnakes, workers, seed=seed, w=w, h=h, useKernel=backend == "numba")
+        # The workers play every game when there's a pool, so there's no game or encoder here then
+        self.game = None
+        self.encoder = None
+        if self.evaluator is None:
+            if showGame:
+                self.game = SnakeGameAI(numSnakes, w, h, seed=seed)
+            elif backend == "python":
+                self.game = SnakeGameNoGUI(numSnakes, w, h, seed=seed)
+            else:
+                self.game = SnakeGameBatched(numSnakes, w, h, seed=seed, useKernel=backend == "numba")
+            self.encoder = StateEncoder(numSnakes)
+        # Batched engine moves every snake in a single step call instead of playStep per snake
+        self.batchedGame = isinstance(self.game, SnakeGameBatched)
+        # Time spent in each phase of the current generation, and the finished record of every generation trained so far
+        self.timer = PhaseTimer()
+        self.generationRecords = []
+        self.metrics = MetricsWriter(metricsPath) if metricsPath else None
+        self.checkpointWriter = None
+        if checkpointName:
+            self.checkpointWriter = CheckpointWriter(os.path.dirname(self.modelPath(checkpointName)), checkpointName, CHECKPOINTS_KEPT, CHECKPOINT_DTYPE)
+        self.lastCheckpoint = time.perf_counter()
+        self.trajectoryWriter = None
+        if recordPath:
+            self.trajectoryWriter = TrajectoryWriter(recordPath, w // BLOCK_SIZE, h // BLOCK_SIZE)
         
-        if modelLoadName and self.loadModel(modelLoadName):
-            savedData = self.loadModel(modelLoadName)
-            self.numGenerations = savedData['numGenerations']
-            self.bestFitnessCurrGeneration = savedData['bestFitnessCurrGeneration']
-            self.bestFitnessEver = savedData['bestFitnessEver']
-            savedModelStateDicts = savedData['modelsStateDicts']
+        # Every model's weights live in one flat tensor, one row per snake
+        # Each model starts with random weights and biases, so each model should be different at the beginning
+        if self.trajectoryWriter is not None and self.evaluator is None:
+            # With workers the games get recorded in the worker processes instead
+            self.game.recorder = GameRecorder()
+        
+        if self.evaluator is not None:
+            # Rows live in the shared genome block so the workers can read them directly
+            self.population = Population(numSnakes, buffers=self.evaluator.genomes, seed=seed)
+        else:
+            self.population = Population(numSnakes, seed=seed)
+
+        savedData = self.loadModel(modelLoadName) if modelLoadName else None
+        if savedData is not None:
+            header, savedGenomes = savedData
+            self.numGenerations = header['numGenerations']
+            self.bestFitnessCurrGeneration = header['bestFitnessCurrGeneration']
+            self.bestFitnessEver = header['bestFitnessEver']
+            self.fitnessHistory = header.get('fitnessHistory', [])
             print(f"Loaded Model\nNum Generations: {self.numGenerations}\nBest Fitness Ever: {self.bestFitnessEver}\nBest Fitness Last Generation: {self.bestFitnessCurrGeneration}")
-            models = []
-            for modelIdx in range(len(savedModelStateDicts)):
-                currModel = EvolutionNetwork(92, 256, 3)
-                currModel.load_state_dict(savedModelStateDicts[modelIdx])
-                models.append(currModel)
+            if len(savedGenomes) != numSnakes:
+                raise Exception("Number of models given does not match number of snakes")
+            if header.get('sizes', list(self.population.sizes)) != list(self.population.sizes):
+                raise Exception(f"Saved models are {header['sizes']}, not {list(self.population.sizes)}")
+            self.population.loadGenomes(savedGenomes)
+            self.population.eliteRows = header.get('elites', [])
+            # Picks up the mutations where the saved run left off
+            if 'rngState' in header:
+                self.population.generator.set_state(decodeState(header['rngState']))
         else:
             self.numGenerations = 0
             self.bestFitnessCurrGeneration = 0
             self.bestFitnessEver = 0
-            # Each model should have randomize weights and biases, so each model should be different at the beginning
-            models = [EvolutionNetwork(92, 256, 3) for i in range(numSnakes)]
-        
-        self.game.reset(models=models)
+            # Best and mean fitness of every generation played, kept in the saves
+            self.fitnessHistory = []
+
+        self.resetGame(self.numGenerations)
+
+    # Starts a new generation with the population's current genomes
+    # generation picks the food streams the games get when there's a seed
+    def resetGame(self, generation=0):
+        if self.evaluator is not None:
+            # Every worker resets its own games when it gets a generation to play
+            return
+        if BATCHED_INFERENCE:
+            # Engines only need models for the one snake at a time getAction
+            self.game.reset(models=[None] * self.numSnakes, generation=generation)
+            # The network is a view into the population, so it only changes when the generation does
+            self.network = self.population.network()
+        else:
+            self.game.reset(models=self.population.models(), generation=generation)
 
     def getState(self, i):
         game = self.game
         currSnake = game.getSnake(i)
         head = currSnake.getHead()
+        food = currSnake.getFood()
+        # Positions are in cells
+        headX = head.x
+        headY = head.y
         # Get 9x9 grid around snake for model inputs
-        snakeVisionArr = []
-        for j in range(-1 * SNAKE_VISION_RADIUS, SNAKE_VISION_RADIUS + 1):
-            for k in range(-1 * SNAKE_VISION_RADIUS, SNAKE_VISION_RADIUS + 1):
-                # If either of these is negative, is_collision will return true
-                checkX = head.x + BLOCK_SIZE * j
-                checkY = head.y + BLOCK_SIZE * k
-                checkPoint = Point(checkX, checkY)
-                if game.isCollision(i, checkPoint):
-                    # If the given point would cause a collision, meaning the wall or snake, append -1
-                    snakeVisionArr.append(-1)
-                elif currSnake.getFood() == checkPoint:
-                    # If the point given is where the food is append 1
-                    snakeVisionArr.append(1)
-                else:
-                    # If its not going to cause a collision or be food, append 0
-                    snakeVisionArr.append(0)
+        # It's sliced straight out of the engine's occupancy grid, which is padded with walls so it never goes out of bounds
+        # Cell x is stored at x + pad, so the window starting at headX - radius starts at headX - radius + pad
+        start = game.pad - SNAKE_VISION_RADIUS
+        size = 2 * SNAKE_VISION_RADIUS + 1
+        window = game.grid[i, headX + start:headX + start + size, headY + start:headY + start + size]
+        # -1 for anything that would cause a collision, meaning the wall or snake, 0 otherwise
+        snakeVision = -window.astype(int)
+        # The head itself isn't a collision
+        snakeVision[SNAKE_VISION_RADIUS, SNAKE_VISION_RADIUS] = 0
+        # 1 where the food is if it's in view
+        foodX = food.x - headX + SNAKE_VISION_RADIUS
+        foodY = food.y - headY + SNAKE_VISION_RADIUS
+        if 0 <= foodX < size and 0 <= foodY < size:
+            snakeVision[foodX, foodY] = 1
 
-        food = currSnake.getFood()
-        direction = currSnake.getDirection()
-        # Get 4 points around the head
-        pointLeft = Point(head.x - BLOCK_SIZE, head.y)
-        pointRight = Point(head.x + BLOCK_SIZE, head.y)
-        pointUp = Point(head.x, head.y - BLOCK_SIZE)
-        pointDown = Point(head.x, head.y + BLOCK_SIZE)
+        # Danger on the 4 points around the head
+        dangerLeft = window[SNAKE_VISION_RADIUS - 1, SNAKE_VISION_RADIUS]
+        dangerRight = window[SNAKE_VISION_RADIUS + 1, SNAKE_VISION_RADIUS]
+        dangerUp = window[SNAKE_VISION_RADIUS, SNAKE_VISION_RADIUS - 1]
+        dangerDown = window[SNAKE_VISION_RADIUS, SNAKE_VISION_RADIUS + 1]
 
         # Get which direction the head is going towards
+        # Every engine stores it as the same clockwise int, which Direction compares equal to
+        direction = currSnake.getDirection()
         dirLeft = direction == Direction.LEFT
         dirRight = direction == Direction.RIGHT
         dirUp = direction == Direction.UP
         dirDown = direction == Direction.DOWN
 
-        state = snakeVisionArr + [
+        state = [
             # Danger straight ahead
-            (dirRight and game.isCollision(i, pointRight)) or 
-            (dirLeft and game.isCollision(i, pointLeft)) or 
-            (dirUp and game.isCollision(i, pointUp)) or 
-            (dirDown and game.isCollision(i, pointDown)),
+            (dirRight and dangerRight) or 
+            (dirLeft and dangerLeft) or 
+            (dirUp and dangerUp) or 
+            (dirDown and dangerDown),
 
             # Danger to the right
-            (dirRight and game.isCollision(i, pointDown)) or 
-            (dirLeft and game.isCollision(i, pointUp)) or 
-            (dirUp and game.isCollision(i, pointRight)) or 
-            (dirDown and game.isCollision(i, pointLeft)),
+            (dirRight and dangerDown) or 
+            (dirLeft and dangerUp) or 
+            (dirUp and dangerRight) or 
+            (dirDown and dangerLeft),
 
             # Danger to the left
-            (dirRight and game.isCollision(i, pointUp)) or 
-            (dirLeft and game.isCollision(i, pointDown)) or 
-            (dirUp and game.isCollision(i, pointLeft)) or 
-            (dirDown and game.isCollision(i, pointRight)),
+            (dirRight and dangerUp) or 
+            (dirLeft and dangerDown) or 
+            (dirUp and dangerLeft) or 
+            (dirDown and dangerRight),
 
             # Move directions
             dirLeft,
@@ -107,7 +181,18 @@ class Agent:
             food.y > head.y  # Food is below us
         ]
 
-        return np.array(state, dtype=int)
+        # Vision is flattened x major, same order as the old nested loop over x then y
+        return np.concatenate([snakeVision.ravel(), np.array(state, dtype=int)])
+
+    # Same as getState, but for every snake in idx at once
+    # Returns a (len(idx), 92) float32 array that gets reused on the next call
+    def getStates(self, idx):
+        return self.encoder.encode(self.game, idx)
+
+    # Indices of the snakes that are still playing
+    # Every engine keeps these compacted as snakes die, so this doesn't look at the dead ones
+    def getAliveSnakes(self):
+        return self.game.aliveIdx
 
     # No need for guessing or idx input
     # Evolution essentially just guesses over and over until it gets good at it, so no need to hardcode guessing
@@ -124,156 +209,248 @@ class Agent:
         nextMove[move] = 1
 
         return nextMove
+
+    # Batched version of getAction, states holds one row per snake in idx
+    # Returns the action index for each snake, 0 straight, 1 right, 2 left
+    def getActions(self, states, idx):
+        return self.network.getActions(states, idx)
     
     # Finds score of given model index and returns
     def fitnessFunction(self, i):
         currSnake = self.game.getSnake(i)
-        score = currSnake.getScore() 
-        frameIterations = currSnake.getFrameIterations()
-        maxIterations = currSnake.getFinalLength() * AMOUNT_OF_FRAMES_TO_DEATH_MULTIPLIER + 1
-        death = currSnake.getDeath()
-        # Score will be based on score, how long it lasted, and how it died
-        # The goal is the get the highest score obviously, but also avoid running into itself later down the line, which was an issue with Q Learning approach
-        fitness = 0
-        fitness += score * 100 # Biggest factor
-        fitness += (frameIterations / maxIterations) * 50 # Shouldn't be a huge amount, but will matter at the beginning of the game
-        if death == 0:
-            # We don't like lazy
-            # Cancels out fitness from surviving by doing nothing
-            fitness *= .9
-        elif death == 1:
-            # We also don't like running into walls, but it's not a huge deal
-            fitness *= .9
-        elif death == 2:
-            # We don't want it running into itself, but later in the game it will be harder
-            fitness *= .9
-        
-        return fitness
+        return float(computeFitness(currSnake.getScore(), currSnake.getFrameIterations(), currSnake.getFinalLength(), currSnake.getDeath()))
 
     # Multithreaded usage
-    def trainBatch(self, gameOvers, gameSteps, batchRange):
-        for idx in batchRange:
-            # print(f"Batch: {batchRange}, idx: {idx}")
-            self.trainIndividual(gameOvers, gameSteps, idx)
-
-    def trainIndividual(self, gameOvers, gameSteps, idx):
-        currSnake = self.game.getSnake(idx)
-        # If current snake's game hasn't ended, get a move and keep playing
-        if not currSnake.getGameOver():
-            currState = self.getState(idx)
-            nextAction = self.getAction(idx, currState)
-            gameSteps[idx] = nextAction
-        else:
-            gameOvers[idx] = True
+    # batch is a slice of the alive snakes, every thread writes its own snakes' action indices into actions
+    def trainBatch(self, actions, batch):
+        for idx in batch:
+            self.trainIndividual(actions, idx)
 
+    def trainIndividual(self, actions, idx):
+        currState = self.getState(idx)
+        nextAction = self.getAction(idx, currState)
+        # [1, 0, 0] -> 0 straight, [0, 1, 0] -> 1 right, [0, 0, 1] -> 2 left
+        actions[idx] = nextAction.index(1)
+
+    # Saves live in the model folder next to this file
+    def modelPath(self, modelName, extension=".ckpt"):
+        currentWorkingDirectory = os.path.dirname(os.path.abspath(__file__))
+        return os.path.join(currentWorkingDirectory, "model", modelName + extension)
+
+    # Returns the save's header and its genomes memory mapped, or None if there's no save with that name
+    # Older .pth saves still load, they get turned into the same header and genomes
     def loadModel(self, modelLoadName):
-        filePath = __file__
-        currentWorkingDirectory = os.path.dirname(os.path.abspath(filePath))
-        loadPath = os.path.join(currentWorkingDirectory, f"model\\{modelLoadName}.pth")
+        loadPath = self.modelPath(modelLoadName)
+        if os.path.exists(loadPath):
+            return loadCheckpoint(loadPath)
+        loadPath = self.modelPath(modelLoadName, ".pth")
         if not os.path.exists(loadPath):
             return None
-        
+
         savedData = torch.load(loadPath)
-        return savedData
+        if 'genomes' in savedData:
+            savedGenomes = savedData['genomes']
+        else:
+            # Older saves have a state dict per model
+            savedModels = []
+            for modelStateDict in savedData['modelsStateDicts']:
+                currModel = EvolutionNetwork(92, 256, 3)
+                currModel.load_state_dict(modelStateDict)
+                savedModels.append(currModel)
+            savedGenomes = Population(len(savedModels))
+            savedGenomes.loadModels(savedModels)
+            savedGenomes = savedGenomes.genomes
+        header = {key: savedData[key] for key in ('numGenerations', 'bestFitnessCurrGeneration', 'bestFitnessEver')}
+        return header, savedGenomes
+
+    # Everything about the run that isn't the genomes, which is all the checkpoint's header holds
+    # numGenerations is only given during train, which doesn't update self.numGenerations until it's done
+    # elites are the rows of the best snakes in the genomes being saved, the population's eliteRows by default
+    def checkpointHeader(self, numGenerations=None, elites=None):
+        return {
+            'numGenerations': self.numGenerations if numGenerations is None else numGenerations,
+            'bestFitnessCurrGeneration': self.bestFitnessCurrGeneration,
+            'bestFitnessEver': self.bestFitnessEver,
+            # Copied since training keeps adding to it while the writer thread has the header
+            'fitnessHistory': list(self.fitnessHistory),
+            'sizes': list(self.population.sizes),
+            'seed': self.seed,
+            'rngState': encodeState(self.population.generator.get_state()),
+            'elites': self.population.eliteRows if elites is None else elites,
+        }
 
     def saveModel(self, modelSaveName=None):
-        filePath = __file__
-        currentWorkingDirectory = os.path.dirname(os.path.abspath(filePath))
         if modelSaveName == None:
             modelSaveName = f"{self.numSnakes}Model-{self.numGenerations + 1}-{self.bestFitnessEver:.2f}-{self.bestFitnessCurrGeneration:.2f}"
-        savePath = os.path.join(currentWorkingDirectory, f"model\\{modelSaveName}.pth")
-        modelsStateDicts = []
-        for i in range(self.numSnakes):
-            currModelStateDict = self.game.getSnake(i).getModel().state_dict()
-            modelsStateDicts.append(currModelStateDict)
-        saveDict = {
-            'modelsStateDicts': modelsStateDicts,
-            'numGenerations': self.numGenerations,
-            'bestFitnessCurrGeneration': self.bestFitnessCurrGeneration,
-            'bestFitnessEver': self.bestFitnessEver
-        }
-        torch.save(saveDict, savePath)
+        savePath = self.modelPath(modelSaveName)
+        os.makedirs(os.path.dirname(savePath), exist_ok=True)
+        saveCheckpoint(savePath, self.population.genomes.numpy(), self.checkpointHeader(), CHECKPOINT_DTYPE)
 
-    def train(self, generations=1):
-        for gen in range(generations):
-            start = time.time()
-            while True:
-                gameOvers = [False] * self.numSnakes
-                gameSteps = [None] * self.numSnakes
-                numThreads = 10
-                batchSize = self.numSnakes // numThreads 
-                batchRanges = []
-                # Start at 0, go to numSnakes, step batchSize at a time
-                for i in range(numThreads):
-                    if i == numThreads - 1:
-                        # Last batch will take on extras since I somehow am struggling to split them up evenly
-                        batchRange = range(i * batchSize, self.numSnakes)
-                    else:
-                        batchRange = range(i * batchSize, i * batchSize + batchSize)
-                    batchRanges.append(batchRange)
-                
-                # print(batchRanges)
-                # return
+    # Appends the games of this generation's RECORD_TOP_SNAKES fittest snakes to the recording
+    # games are the GameRecords the workers sent back, None when the games were played here
+    def recordGames(self, games, generation, fitness, scores, deaths, frameIterations):
+        if games is None:
+            games = self.game.recorder.topGames(RECORD_TOP_SNAKES, generation, fitness, scores, deaths, frameIterations)
+        else:
+            # Every shard sent its own best, only the best of all of them are kept
+            # The workers number generations from 0 like the seeds do, the recording numbers them like the printouts
+            games = [game._replace(generation=generation) for game in sorted(games, key=lambda game: game.fitness, reverse=True)[:RECORD_TOP_SNAKES]]
+        for game in games:
+            self.trajectoryWriter.write(game)
+        self.trajectoryWriter.flush()
+
+    # Hands a copy of the population to the checkpoint writer if a checkpoint is due
+    # Only the copy happens here, the file gets written on the writer's thread
+    def checkpoint(self, numGenerations):
+        now = time.perf_counter()
+        due = (CHECKPOINT_EVERY_GENERATIONS and numGenerations % CHECKPOINT_EVERY_GENERATIONS == 0) or \
+              (CHECKPOINT_EVERY_SECONDS and now - self.lastCheckpoint >= CHECKPOINT_EVERY_SECONDS)
+        if not due:
+            return
+        self.checkpointWriter.save(self.population.genomes.numpy().copy(), self.checkpointHeader(numGenerations))
+        self.lastCheckpoint = now
+
+    # Saves the generation that just set a new best fitness, before evolve replaces it
+    # Small populations don't keep any elites, so after evolve the best snake might not be in the population at all
+    # numGenerations is how many generations came before this one, loading it plays this same population again
+    def checkpointBest(self, numGenerations, fitness):
+        numElites = max(1, self.numSnakes // 10)
+        elites = [int(i) for i in np.argsort(-np.asarray(fitness), kind="stable")[:numElites]]
+        header = self.checkpointHeader(numGenerations, elites)
+        # This generation gets played again when the file is loaded, so its entry would end up in the history twice
+        header['fitnessHistory'] = header['fitnessHistory'][:-1]
+        self.checkpointWriter.save(self.population.genomes.numpy().copy(), header, best=True)
+
+    # Moves every snake that's still alive with its action index, every engine drops the ones that die from its alive snakes
+    def stepGame(self, actions):
+        self.game.step(actions)
+
+    # How many frames every snake has played this generation
+    def getFrameIterations(self):
+        if self.batchedGame:
+            return self.game.frameIterations.copy()
+        return np.array([self.game.getSnake(i).getFrameIterations() for i in range(self.numSnakes)])
+
+    def getScores(self):
+        if self.batchedGame:
+            return self.game.scores.copy()
+        return np.array([self.game.getSnake(i).getScore() for i in range(self.numSnakes)])
+
+    # Death code of every snake, -1 for the ones still playing
+    def getDeaths(self):
+        if self.batchedGame:
+            return self.game.deaths.copy()
+        deaths = [self.game.getSnake(i).getDeath() for i in range(self.numSnakes)]
+        return np.array([-1 if death is None else death for death in deaths])
+
+    # Plays every snake's game of the current generation until they're all over, or until it runs out of frame or time budget
+    def playGeneration(self):
+        timer = self.timer
+        frames = 0
+        start = time.perf_counter()
+        # Action index for each snake, 0 straight, 1 right, 2 left
+        # Only the alive snakes' entries get written and read, so it's made once for the whole generation
+        actions = np.zeros(self.numSnakes, dtype=np.int64)
+        while True:
+            mark = time.perf_counter()
+            if (GENERATION_FRAME_BUDGET and frames >= GENERATION_FRAME_BUDGET) or (GENERATION_TIME_BUDGET and mark - start >= GENERATION_TIME_BUDGET):
+                self.game.stopGames()
+                break
+            frames += 1
+            aliveIdx = self.getAliveSnakes()
+            if len(aliveIdx) == 0:
+                break
+            if BATCHED_INFERENCE:
+                # The network keeps whatever it copied out for this alive set until a snake dies, so frames without a death don't copy any weights
+                # That only holds because the network is rebuilt every generation, resetGame does it
+                states = self.getStates(aliveIdx)
+                mark = timer.lap("encode", mark)
+                actions[aliveIdx] = self.getActions(states, aliveIdx)
+                mark = timer.lap("inference", mark)
+            else:
+                # Only the alive snakes get split between the threads, and never more threads than snakes
+                numThreads = min(10, len(aliveIdx))
                 threads = []
-                for i in range(numThreads):
-                    thread = Thread(target=self.trainBatch, args=(gameOvers, gameSteps, batchRanges[i]))
+                for batch in np.array_split(aliveIdx, numThreads):
+                    thread = Thread(target=self.trainBatch, args=(actions, batch))
                     thread.start()
                     threads.append(thread)
 
                 for thread in threads:
                     thread.join()
+                # The threads build the states and run the models together, so it all counts as inference
+                mark = timer.lap("inference", mark)
 
-                for snakeIdx in range(self.numSnakes):
-                    if gameSteps[snakeIdx] is not None:
-                        self.game.playStep(gameSteps[snakeIdx], snakeIdx)
+            self.stepGame(actions)
+            mark = timer.lap("step", mark)
 
-                # No need if theres no GUI
-                if SHOW_GAME:
-                    self.game.updateUi()
-                if gameOvers.count(True) == self.numSnakes:
-                    # print(currSnake.getModel().state_dict())
-                    break
-        
-            # TODO Logic for generation evolution
-            if self.numSnakes > 1:
-                fitness = []
-                for i in range(self.numSnakes):
-                    currFitness = self.fitnessFunction(i)
-                    fitness.append(currFitness)
-                sortedFitness = fitness[:]
-                sortedFitness.sort(reverse=True)
-                self.bestFitnessCurrGeneration = sortedFitness[0]
-                if sortedFitness[0] > self.bestFitnessEver:
-                    self.bestFitnessEver = sortedFitness[0]
-                # print(fitness)
-                # print(sortedFitness)
-                # print(fitness.index(max(fitness)))
-                parentAIndex = fitness.index(sortedFitness[0])
-                parentBIndex = fitness.index(sortedFitness[1])
-
-                parentA = self.game.getSnake(parentAIndex).getModel()
-                parentB = self.game.getSnake(parentBIndex).getModel()
-
-                # Don't mutate first child
-                child = averageCrossover(parentA, parentB, mutationRate=0)
-                models = [child]
-                # Get the best 10% from previous generation
-                for currBestIdx in range(self.numSnakes // 10):
-                    currBestId = fitness.index(sortedFitness[currBestIdx])
-                    currBestModel = self.game.getSnake(currBestId).getModel()
-                    models.append(currBestModel)
-                l = len(models)
-                # print(l) # numSnakes - 1 - numSnakes // 10
-                for i in range(l, self.numSnakes):
-                    # We want each model to mutate
-                    model = mutateModel(child, mutationRate=1)
-                    models.append(model)
+            # No need if theres no GUI
+            if self.showGame:
+                self.game.updateUi()
+                timer.lap("render", mark)
+
+    def train(self, generations=1):
+        for gen in range(generations):
+            start = time.time()
+            self.timer.startGeneration(self.numGenerations + gen)
+            mark = time.perf_counter()
+            if self.evaluator is not None:
+                # Games get played in the worker processes, only the results come back
+                results = self.evaluator.evaluate(self.population.currentSlab, self.numGenerations + gen, RECORD_TOP_SNAKES if self.trajectoryWriter else 0)
+                fitness = results['fitness'].tolist()
+                frameIterations = results['frameIterations']
+                scores = results['scores']
+                deaths = results['deaths']
+                mark = self.timer.lap("evaluate", mark)
             else:
-                newModel = mutateModel(self.game.getSnake(0).getModel(), mutationRate=1)
-                models = [newModel]
-            # print(len(models)) # numSnakes
+                self.playGeneration()
+                mark = time.perf_counter()
+                fitness = [self.fitnessFunction(i) for i in range(self.numSnakes)]
+                frameIterations = self.getFrameIterations()
+                scores = self.getScores()
+                deaths = self.getDeaths()
+                mark = self.timer.lap("fitness", mark)
+            if self.trajectoryWriter is not None:
+                self.recordGames(results['games'] if self.evaluator is not None else None, self.numGenerations + gen + 1, fitness, scores, deaths, frameIterations)
+                mark = self.timer.lap("record", mark)
+            sortedFitness = fitness[:]
+            sortedFitness.sort(reverse=True)
+            self.bestFitnessCurrGeneration = sortedFitness[0]
+            newBest = sortedFitness[0] > self.bestFitnessEver
+            if newBest:
+                self.bestFitnessEver = sortedFitness[0]
+            self.fitnessHistory.append({'generation': self.numGenerations + gen + 1, 'best': sortedFitness[0], 'mean': sum(sortedFitness) / len(sortedFitness)})
+
+            if newBest and self.checkpointWriter is not None:
+                self.checkpointBest(self.numGenerations + gen, fitness)
+                mark = self.timer.lap("checkpoint", mark)
+
+            # Next generation is the crossover of the 2 best, the best 10% as they are, and mutated copies of that crossover
+            self.population.evolve(fitness, CROSSOVER_METHOD, MUTATION_RATE, MUTATION_STRENGTH)
+            mark = self.timer.lap("evolve", mark)
+            self.resetGame(self.numGenerations + gen + 1)
+            mark = self.timer.lap("reset", mark)
+            if self.checkpointWriter is not None:
+                self.checkpoint(self.numGenerations + gen + 1)
+                self.timer.lap("checkpoint", mark)
+            record = self.timer.record(frameIterations)
+            self.generationRecords.append(record)
+            if self.metrics is not None:
+                self.metrics.write(generationMetrics(self.numGenerations + gen + 1, fitness, scores, deaths, record))
             end = time.time()
             print(f"Generation {self.numGenerations + gen + 1} done\n\tBest fitness: {sortedFitness[0]:.2f}\n\tMean fitness: {sum(sortedFitness) / len(sortedFitness):.2f}\n\tMedian fitness: {sortedFitness[len(sortedFitness) // 2]:.2f}\n\tWorst fitness: {sortedFitness[-1]:.2f}\n\tChild of previous gen's fitness: {fitness[0]:.2f}\n\tTime taken: {end - start:.2f}s")
-            self.game.reset(models)
+            if PRINT_PHASE_TIMES:
+                print(f"\tFrames: {record['frames']}, snake frames: {record['snakeFrames']}\n\tPhases: {formatPhases(record)}")
+
+        self.numGenerations += generations
 
-        self.numGenerations += generations
\ No newline at end of file
+    # Shuts down the worker processes if there are any and writes out whatever metrics and checkpoints are still waiting
+    def close(self):
+        if self.evaluator is not None:
+            self.evaluator.close()
+        if self.metrics is not None:
+            self.metrics.close()
+        if self.checkpointWriter is not None:
+            self.checkpointWriter.close()
+        if self.trajectoryWriter is not None:
+            self.trajectoryWriter.close()
@@ -0,0 +1,208 @@
+### Everything the benchmark runner can measure, CPU only
+### Every case returns a list of result dicts, one per configuration it ran, which the runner writes out as JSON
+import time
+import io
+import contextlib
+import statistics
+import numpy as np
+from agent import Agent
+from model import mutateModel, averageCrossover, Population
+from SnakeGames.SnakeGameNoGUI import SnakeGameNoGUI
+from SnakeGames.SnakeGameBatched import SnakeGameBatched
+from config import BLOCK_SIZE
+
+# Calls fn until it has run for at least minTime seconds and minRepeats times
+# fn returns how many things it did (frames, states, actions...), returns the time and count of every call
+def timeCalls(fn, minTime=1.0, minRepeats=3):
+    times = []
+    counts = []
+    start = time.perf_counter()
+    while len(times) < minRepeats or time.perf_counter() - start < minTime:
+        callStart = time.perf_counter()
+        count = fn()
+        times.append(time.perf_counter() - callStart)
+        counts.append(count)
+    return times, counts
+
+# One row of the JSON results
+# value is the headline number in unit, seconds is the median time of one call
+def result(case, unit, times, counts, **config):
+    total = sum(times)
+    perSecond = unit.endswith("/s")
+    return {
+        'case': case,
+        **config,
+        'value': sum(counts) / total if perSecond else statistics.median(times),
+        'unit': unit,
+        'seconds': statistics.median(times),
+        'repeats': len(times),
+    }
+
+def makeGame(backend, numSnakes, board, seed):
+    if backend == "python":
+        return SnakeGameNoGUI(numSnakes, board * BLOCK_SIZE, board * BLOCK_SIZE, seed=seed)
+    return SnakeGameBatched(numSnakes, board * BLOCK_SIZE, board * BLOCK_SIZE, seed=seed, useKernel=backend == "numba")
+
+# Numba compiles the step kernel on its first call, that shouldn't end up in the first numba timing
+def compileKernel():
+    game = SnakeGameBatched(1, useKernel=True)
+    game.reset([None])
+    game.step(np.zeros(1, dtype=np.int64))
+
+def makeAgent(backend, numSnakes, board, seed):
+    return Agent(numSnakes, seed=seed, showGame=False, backend=backend, workers=0, w=board * BLOCK_SIZE, h=board * BLOCK_SIZE)
+
+# Random actions that avoid the wall and body when they can, so games last long enough to measure
+# Returns an action index per snake
+def safeActions(game, rng):
+    actions = rng.choice(3, size=game.numSnakes, p=[.6, .2, .2])
+    alive = game.aliveIdx
+    if isinstance(game, SnakeGameBatched):
+        heads = game.heads
+        directions = game.directions
+    else:
+        heads = np.zeros((game.numSnakes, 2), dtype=np.int64)
+        directions = np.zeros(game.numSnakes, dtype=np.int64)
+        for i in alive:
+            heads[i] = game.snakes[i].head
+            directions[i] = game.snakes[i].direction
+    deltas = np.array([[1, 0], [0, 1], [-1, 0], [0, -1]])
+    for i in alive:
+        for action in (actions[i], 0, 1, 2):
+            x, y = heads[i] + deltas[(directions[i] + (0, 1, -1)[action]) % 4]
+            if not game.grid[i, x + game.pad, y + game.pad]:
+                actions[i] = action
+                break
+    return actions
+
+# Plays frames with safe actions, starting over whenever every snake is dead
+# Returns how many snake frames got played and how long was spent inside the engine, picking the actions isn't counted
+def playFrames(game, rng, frames):
+    played = 0
+    elapsed = 0
+    for frame in range(frames):
+        actions = safeActions(game, rng)
+        alive = game.aliveIdx
+        start = time.perf_counter()
+        game.step(actions)
+        elapsed += time.perf_counter() - start
+        played += len(alive)
+        if len(alive) == 0:
+            game.reset([None] * game.numSnakes)
+    return played, elapsed
+
+# Snake frames per second of the engine alone
+def engineStep(backend, numSnakes, board, seed=0, minTime=1.0, frames=50):
+    game = makeGame(backend, numSnakes, board, seed)
+    rng = np.random.default_rng(seed)
+    game.reset([None] * numSnakes)
+    times = []
+    counts = []
+    start = time.perf_counter()
+    while len(times) < 3 or time.perf_counter() - start < minTime:
+        played, elapsed = playFrames(game, rng, frames)
+        times.append(elapsed)
+        counts.append(played)
+    return [result("engineStep", "snakeFrames/s", times, counts, backend=backend, numSnakes=numSnakes, board=board)]
+
+# Plays a few frames with safe actions so the states aren't all from the starting position
+def warmUp(agent, seed, frames=10):
+    rng = np.random.default_rng(seed)
+    for frame in range(frames):
+        agent.stepGame(safeActions(agent.game, rng))
+
+# States per second of Agent.getState one snake at a time, and of the batched encoder
+def stateEncoding(numSnakes, board, seed=0, minTime=1.0):
+    agent = makeAgent("batched", numSnakes, board, seed)
+    warmUp(agent, seed)
+    alive = agent.getAliveSnakes()
+    results = []
+    # Both have to give the same states, otherwise timing them against each other means nothing
+    if not np.array_equal(np.array([agent.getState(i) for i in alive]), agent.getStates(alive)):
+        raise Exception("getState and getStates don't give the same states")
+
+    def perSnake():
+        for i in alive:
+            agent.getState(i)
+        return len(alive)
+    times, counts = timeCalls(perSnake, minTime)
+    results.append(result("getState", "states/s", times, counts, numSnakes=numSnakes, board=board))
+
+    def batched():
+        agent.getStates(alive)
+        return len(alive)
+    times, counts = timeCalls(batched, minTime)
+    results.append(result("getStates", "states/s", times, counts, numSnakes=numSnakes, board=board))
+    agent.close()
+    return results
+
+# Actions per second of Agent.getAction one model at a time, and of one batched forward pass over the population
+def inference(numSnakes, board=6, seed=0, minTime=1.0):
+    agent = makeAgent("batched", numSnakes, board, seed)
+    # getAction reads each snake's own model out of the game
+    agent.game.reset(agent.population.models())
+    idx = np.arange(numSnakes)
+    states = agent.getStates(idx).copy()
+    results = []
+
+    def perSnake():
+        for i in idx:
+            agent.getAction(i, states[i])
+        return numSnakes
+    times, counts = timeCalls(perSnake, minTime)
+    results.append(result("getAction", "actions/s", times, counts, numSnakes=numSnakes))
+
+    def batched():
+        agent.getActions(states, idx)
+        return numSnakes
+    times, counts = timeCalls(batched, minTime)
+    results.append(result("getActions", "actions/s", times, counts, numSnakes=numSnakes, alive=1.0))
+
+    # Partly dead populations, the same alive snakes call it frame after frame like they do during a generation
+    rng = np.random.default_rng(seed)
+    for aliveFraction in (0.9, 0.3):
+        aliveIdx = np.sort(rng.choice(numSnakes, max(1, int(numSnakes * aliveFraction)), replace=False))
+        aliveStates = states[aliveIdx]
+        def partlyDead():
+            agent.getActions(aliveStates, aliveIdx)
+            return len(aliveIdx)
+        times, counts = timeCalls(partlyDead, minTime)
+        results.append(result("getActions", "actions/s", times, counts, numSnakes=numSnakes, alive=aliveFraction))
+    agent.close()
+    return results
+
+# Seconds to build one whole generation, one model at a time with averageCrossover and mutateModel, and with Population.evolve
+def evolution(numSnakes, seed=0, minTime=1.0):
+    population = Population(numSnakes, seed=seed)
+    fitness = np.random.default_rng(seed).random(numSnakes).tolist()
+    results = []
+
+    models = [population.getModel(i) for i in range(min(numSnakes, 2))]
+    def perModel():
+        # Same amount of work the old train loop did, a crossover of the 2 best then a mutated copy for everyone but the elites
+        child = averageCrossover(models[0], models[-1])
+        for i in range(numSnakes - 1 - numSnakes // 10):
+            mutateModel(child)
+        return numSnakes
+    times, counts = timeCalls(perModel, minTime)
+    results.append(result("mutateModel+averageCrossover", "s/generation", times, counts, numSnakes=numSnakes))
+
+    def batched():
+        population.evolve(fitness)
+        return numSnakes
+    times, counts = timeCalls(batched, minTime)
+    results.append(result("Population.evolve", "s/generation", times, counts, numSnakes=numSnakes))
+    return results
+
+# Seconds for Agent.train to play and evolve one generation, end to end
+def generation(backend, numSnakes, board, seed=0, minTime=1.0):
+    agent = makeAgent(backend, numSnakes, board, seed)
+
+    def run():
+        # train prints a summary of every generation
+        with contextlib.redirect_stdout(io.StringIO()):
+            agent.train(1)
+        return 1
+    times, counts = timeCalls(run, minTime)
+    agent.close()
+    return [result("generation", "s/generation", times, counts, backend=backend, numSnakes=numSnakes, board=board)]
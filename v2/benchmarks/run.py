@@ -0,0 +1,87 @@
+### Runs the benchmark cases over every population size, board size and backend asked for and writes the results as JSON
+### Run from v2: python -m benchmarks.run --out results.json
+### Compare two runs by matching rows on case, backend, numSnakes, board and alive
+import argparse
+import json
+import os
+import sys
+import time
+import platform
+import subprocess
+import numpy as np
+import torch
+from SnakeGames.kernels import NUMBA_AVAILABLE
+from benchmarks import cases
+
+CASES = ["engine", "state", "inference", "evolution", "generation"]
+BACKENDS = ["python", "batched"] + (["numba"] if NUMBA_AVAILABLE else [])
+
+# Machine and code the numbers came from, so runs from different hosts or commits don't get mixed up
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'commit': commit or None,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'torch': torch.__version__,
+        'torchThreads': torch.get_num_threads(),
+        'numba': NUMBA_AVAILABLE,
+    }
+
+def runAll(args):
+    results = []
+    if "numba" in args.backends:
+        cases.compileKernel()
+
+    def add(rows):
+        for row in rows:
+            print(f"{row['case']:>30} {row.get('backend', ''):>8} {row.get('numSnakes', ''):>6} {row.get('board', ''):>4} {row.get('alive', ''):>4}  {row['value']:.6g} {row['unit']}")
+            results.append(row)
+
+    for numSnakes in args.sizes:
+        if "inference" in args.cases:
+            add(cases.inference(numSnakes, seed=args.seed, minTime=args.minTime))
+        if "evolution" in args.cases:
+            add(cases.evolution(numSnakes, seed=args.seed, minTime=args.minTime))
+        for board in args.boards:
+            if "state" in args.cases:
+                add(cases.stateEncoding(numSnakes, board, seed=args.seed, minTime=args.minTime))
+            for backend in args.backends:
+                if "engine" in args.cases:
+                    add(cases.engineStep(backend, numSnakes, board, seed=args.seed, minTime=args.minTime))
+                if "generation" in args.cases:
+                    add(cases.generation(backend, numSnakes, board, seed=args.seed, minTime=args.minTime))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default="benchmarkResults.json")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=CASES)
+    parser.add_argument("--backends", nargs="+", choices=["python", "batched", "numba"], default=BACKENDS)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[50, 250, 1000, 5000])
+    # Board width and height in cells, the smallest the games can start on is 4
+    parser.add_argument("--boards", nargs="+", type=int, default=[6, 12, 20, 32])
+    # Every measurement keeps going for at least this long
+    parser.add_argument("--minTime", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    # Small sizes and short timings, just to check everything still runs
+    parser.add_argument("--quick", action="store_true")
+    args = parser.parse_args()
+    if args.quick:
+        args.sizes = [50, 250]
+        args.boards = [6, 12]
+        args.minTime = 0.2
+    if "numba" in args.backends and not NUMBA_AVAILABLE:
+        sys.exit("The numba backend needs numba installed")
+
+    results = runAll(args)
+    with open(args.out, "w") as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.out}")
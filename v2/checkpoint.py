@@ -0,0 +1,139 @@
+### Saved populations, a small JSON header followed by every genome as one contiguous array
+### The array can be memory mapped, so resuming or looking at a few snakes never reads the whole file
+### Layout: MAGIC, header length as a little endian uint32, the JSON header, padding, then the (numSnakes, numParams) array at header['dataOffset']
+### Run it on a file to print its header: python checkpoint.py model/name.ckpt
+import os
+import re
+import sys
+import json
+import base64
+import struct
+import threading
+import numpy as np
+import torch
+
+MAGIC = b"SNAKECKP"
+VERSION = 1
+# Where the genomes start gets rounded up to this, so the mapped array is aligned
+ALIGNMENT = 64
+DTYPES = ("float32", "float16")
+
+# genomes is a (numSnakes, numParams) array or tensor, header is anything JSON can hold
+# dtype float16 halves the file size, the genomes get turned back into float32 when they're loaded into a Population
+def saveCheckpoint(path, genomes, header, dtype="float32"):
+    if dtype not in DTYPES:
+        raise Exception(f"Unknown checkpoint dtype {dtype}")
+    genomes = np.asarray(genomes)
+    header = dict(header, version=VERSION, dtype=dtype, shape=list(genomes.shape))
+    # Offset depends on the header's own length, so it's worked out with a placeholder first
+    header['dataOffset'] = 0
+    headerLength = len(json.dumps(header).encode()) + 16
+    dataOffset = -(-(len(MAGIC) + 4 + headerLength) // ALIGNMENT) * ALIGNMENT
+    header['dataOffset'] = dataOffset
+    headerBytes = json.dumps(header).encode().ljust(dataOffset - len(MAGIC) - 4)
+
+    data = np.ascontiguousarray(genomes, dtype=np.dtype(dtype).newbyteorder("<"))
+    # Written next to the real file and renamed over it, so a crash halfway through never leaves a broken save behind
+    tempPath = path + ".tmp"
+    with open(tempPath, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(headerBytes)))
+        f.write(headerBytes)
+        f.write(memoryview(data).cast("B"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tempPath, path)
+
+# Only reads the header, not the genomes
+def readHeader(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise Exception(f"{path} is not a checkpoint")
+        headerLength, = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(headerLength))
+    if header['version'] > VERSION:
+        raise Exception(f"{path} is checkpoint version {header['version']}, this code only reads up to {VERSION}")
+    return header
+
+# Every genome as a read only memory mapped (numSnakes, numParams) array, only the rows that get used are read from disk
+def mapGenomes(path, header=None):
+    if header is None:
+        header = readHeader(path)
+    dtype = np.dtype(header['dtype']).newbyteorder("<")
+    return np.memmap(path, dtype=dtype, mode="r", offset=header['dataOffset'], shape=tuple(header['shape']))
+
+# Header and genomes together, rows picks out just some snakes (like header['elites']) as a float32 array
+def loadCheckpoint(path, rows=None):
+    header = readHeader(path)
+    genomes = mapGenomes(path, header)
+    if rows is not None:
+        genomes = genomes[np.asarray(rows, dtype=np.int64)]
+    return header, genomes
+
+# torch.Generator states are byte tensors, stored as base64 text in the header
+def encodeState(state):
+    return base64.b64encode(state.numpy().tobytes()).decode()
+
+def decodeState(text):
+    return torch.frombuffer(bytearray(base64.b64decode(text)), dtype=torch.uint8)
+
+# Writes checkpoints on a background thread so training never waits on the disk
+# Periodic saves go to directory/name-<generation>.ckpt and only the newest keep of them are kept (0 keeps them all), the best ever goes to directory/name-best.ckpt
+# Only the newest snapshot of each kind waits to be written, if the disk can't keep up the older one is skipped instead of piling up in memory
+class CheckpointWriter:
+    def __init__(self, directory, name, keep=3, dtype="float32"):
+        self.directory = directory
+        self.name = name
+        self.keep = keep
+        self.dtype = dtype
+        os.makedirs(directory, exist_ok=True)
+        self.pending = {}
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    # genomes has to be a copy the caller won't touch again, header is the checkpoint header, returns right away
+    def save(self, genomes, header, best=False):
+        with self.condition:
+            self.pending["best" if best else "periodic"] = (genomes, header)
+            self.condition.notify()
+
+    # Writes whatever is still waiting and stops the thread
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                kind, (genomes, header) = self.pending.popitem()
+            try:
+                if kind == "best":
+                    saveCheckpoint(os.path.join(self.directory, f"{self.name}-best.ckpt"), genomes, header, self.dtype)
+                else:
+                    saveCheckpoint(os.path.join(self.directory, f"{self.name}-{header['numGenerations']}.ckpt"), genomes, header, self.dtype)
+                    self._prune()
+            except OSError as error:
+                # A failed save shouldn't take the training down with it, the next one gets another try
+                print(f"Checkpoint failed: {error}")
+
+    # Removes all but the newest keep periodic checkpoints, older runs with the same name included
+    def _prune(self):
+        pattern = re.compile(re.escape(self.name) + r"-(\d+)\.ckpt$")
+        generations = sorted(int(match.group(1)) for match in map(pattern.match, os.listdir(self.directory)) if match)
+        for generation in generations[:-self.keep]:
+            os.remove(os.path.join(self.directory, f"{self.name}-{generation}.ckpt"))
+
+if __name__ == "__main__":
+    header = readHeader(sys.argv[1])
+    header.pop('rngState', None)
+    history = header.pop('fitnessHistory', [])
+    print(json.dumps(header, indent=2))
+    print(f"{len(history)} generations of fitness history, file is {os.path.getsize(sys.argv[1]) / 1e6:.1f}MB")
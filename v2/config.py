@@ -2,15 +2,61 @@
 # 4 will create a 9x9 grid with the snake's head at the center
 SNAKE_VISION_RADIUS = 4
 
+# Evaluate every live snake with one batched forward pass per frame instead of one model call per snake
+BATCHED_INFERENCE = True
+
+# Print how long each phase of a generation took (encoding, inference, stepping...) after every generation
+PRINT_PHASE_TIMES = True
+
+# Number of worker processes to play each generation with when SHOW_GAME is False, 0 plays it in this process
+PARALLEL_WORKERS = 0
+
+# How the next generation gets built
+# Crossover of the 2 best snakes, one of "average", "blend", "uniform" or "singlePoint"
+CROSSOVER_METHOD = "average"
+# Chance for each weight of a child to get mutated, and how big that mutation is
+MUTATION_RATE = 1
+MUTATION_STRENGTH = 0.1
+
 # Number of frames it takes for the game to end if the snake doesnt do anything
 # formula is multiplier * length of snake
 AMOUNT_OF_FRAMES_TO_DEATH_MULTIPLIER = 100
 
+# End a snake's game with a lazy death as soon as it's back in a state (head, direction and body) it was already in since its last food
+# The models always pick the same move for the same state, so those snakes would just go in circles until the multiplier death above
+LOOP_DETECTION = False
+
+# Stop a generation after this many frames or seconds even if some snakes are still going, 0 for no limit
+# Snakes that are still going keep the fitness they have so far without a death penalty
+GENERATION_FRAME_BUDGET = 0
+GENERATION_TIME_BUDGET = 0
+
 
 #################################################
 # Game Variables                                #
 #################################################
 SHOW_GAME = True
+# 0 draws every single frame and slows the game down to SPEED frames a second to watch it properly
+# Anything else redraws the window that many times a second on its own thread while the snakes play as fast as they can (30 or so is plenty)
+# Some platforms (macOS) only open windows from the main thread, keep it at 0 there
+RENDER_FPS = 0
+
+# How saved populations store their weights, "float32" or "float16" for files half the size that lose a little precision
+CHECKPOINT_DTYPE = "float32"
+# Save a checkpoint in the background every this many generations or seconds during training, 0 turns either one off
+CHECKPOINT_EVERY_GENERATIONS = 10
+CHECKPOINT_EVERY_SECONDS = 0
+# How many of the periodic checkpoints to keep, the best population ever is always kept on top of these
+CHECKPOINTS_KEPT = 3
+
+# How many of every generation's fittest snakes get their games saved when recording with main.py --record
+RECORD_TOP_SNAKES = 5
+
+# Which headless engine to use when SHOW_GAME is False
+# "python" steps every snake one at a time through SnakeGameNoGUI
+# "batched" moves the whole population at once with SnakeGameBatched
+# "numba" is SnakeGameBatched with its compiled step kernel, needs numba installed
+GAME_BACKEND = "batched"
 
 BLOCK_SIZE = 30
 SPEED = 50
@@ -0,0 +1,37 @@
+import numpy as np
+from config import *
+
+# How much of the fitness a snake keeps based on how it died
+# 0 Lazy, didn't get any more fruit and just died bc of multiplier death
+# 1 Wall
+# 2 Hit itself
+# 3 Won, filled the whole board
+# 4 Still going when the generation ran out of frames or time
+DEATH_MULTIPLIERS = {
+    # We don't like lazy
+    # Cancels out fitness from surviving by doing nothing
+    0: .9,
+    # We also don't like running into walls, but it's not a huge deal
+    1: .9,
+    # We don't want it running into itself, but later in the game it will be harder
+    2: .9,
+    # Nothing to take away, there was no food left to get
+    3: 1,
+    # Wasn't done yet, it doesn't get punished for the generation being cut short
+    4: 1,
+}
+
+# Fitness of one snake, or of a whole population when given numpy arrays
+# Score will be based on score, how long it lasted, and how it died
+# The goal is the get the highest score obviously, but also avoid running into itself later down the line, which was an issue with Q Learning approach
+def computeFitness(score, frameIterations, finalLength, death):
+    score = np.asarray(score, dtype=np.float64)
+    frameIterations = np.asarray(frameIterations, dtype=np.float64)
+    death = np.asarray(death)
+    maxIterations = np.asarray(finalLength, dtype=np.float64) * AMOUNT_OF_FRAMES_TO_DEATH_MULTIPLIER + 1
+    fitness = score * 100 # Biggest factor
+    fitness = fitness + (frameIterations / maxIterations) * 50 # Shouldn't be a huge amount, but will matter at the beginning of the game
+    multiplier = np.ones_like(fitness)
+    for deathType, deathMultiplier in DEATH_MULTIPLIERS.items():
+        multiplier[death == deathType] = deathMultiplier
+    return fitness * multiplier
@@ -0,0 +1,30 @@
+### Catches snakes that are going around in circles, used by the engines when LOOP_DETECTION is on
+### A snake's models always pick the same move for the same board, so once a snake is back in a state (head, direction and body) it was in since its last food, it will loop until the lazy timeout
+### Every state gets a 64 bit hash that's updated in O(1) per frame, and Brent's cycle detection compares it against one saved state, so nothing grows with the length of the game
+import numpy as np
+
+MASK = (1 << 64) - 1
+# Odd, so multiplying by it never loses bits
+HASH_BASE = 0x9E3779B97F4A7C15
+
+# The body hash is key[head] + key[next] * BASE + ... + key[tail] * BASE^(length - 1), all mod 2^64
+# Keys are fixed so every engine and worker process gets the same hashes
+_keyStream = np.random.default_rng(0x5EED)
+DIRECTION_KEYS = _keyStream.bit_generator.random_raw(4)
+_cellKeys = {}
+
+# Random key for every flat cell x * rows + y of a board with numCells cells, as a uint64 array
+def cellKeys(numCells):
+    if numCells not in _cellKeys:
+        _cellKeys[numCells] = np.random.default_rng(0xCE11).bit_generator.random_raw(numCells)
+    return _cellKeys[numCells]
+
+# Hash of a body given as flat cells from head to tail, returns (hash, BASE^(length - 1)) as python ints
+def hashBody(cells, keys):
+    bodyHash = 0
+    tailPower = 1
+    for j, cell in enumerate(cells):
+        if j > 0:
+            tailPower = tailPower * HASH_BASE & MASK
+        bodyHash = (bodyHash + int(keys[cell]) * tailPower) & MASK
+    return bodyHash, tailPower
@@ -1,13 +1,32 @@
 from agent import Agent
-import sys
+import argparse
+import cProfile
 
 if __name__ == "__main__":
-    args = iter(sys.argv[1:])
-    numSnakes = int(next(args, 250))
-    numGenerations = int(next(args, 100))
-    modelLoadName = next(args, None)
-    modelSaveName = next(args, None)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("numSnakes", nargs="?", type=int, default=250)
+    parser.add_argument("numGenerations", nargs="?", type=int, default=100)
+    parser.add_argument("modelLoadName", nargs="?", default=None)
+    parser.add_argument("modelSaveName", nargs="?", default=None)
+    # Same seed, same run, from the starting weights down to where every piece of food lands
+    parser.add_argument("--seed", type=int, default=None)
+    # Writes cProfile stats of the whole training run to this file, open it with pstats or snakeviz
+    parser.add_argument("--profile", default=None)
+    # Appends a record of every generation to this .jsonl or .csv file, plot it with plotMetrics.py
+    parser.add_argument("--metrics", default=None)
+    # Checkpoints get saved in the background while training as model/NAME-<generation>.ckpt and model/NAME-best.ckpt, see CHECKPOINT_EVERY_GENERATIONS
+    # Resume from one by giving its name as modelLoadName
+    parser.add_argument("--checkpoint", default=None)
+    # Appends the games of every generation's fittest snakes to this file, see RECORD_TOP_SNAKES and replay.py
+    parser.add_argument("--record", default=None)
+    args = parser.parse_args()
 
-    agent = Agent(numSnakes, modelLoadName=modelLoadName)
-    agent.train(numGenerations)
-    agent.saveModel(modelSaveName)
\ No newline at end of file
+    agent = Agent(args.numSnakes, modelLoadName=args.modelLoadName, seed=args.seed, metricsPath=args.metrics, checkpointName=args.checkpoint, recordPath=args.record)
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.runcall(agent.train, args.numGenerations)
+        profiler.dump_stats(args.profile)
+    else:
+        agent.train(args.numGenerations)
+    agent.saveModel(args.modelSaveName)
+    agent.close()
@@ -0,0 +1,105 @@
+### Structured record of every generation, written to a file so runs can be plotted and compared later with plotMetrics.py
+### JSONL by default, CSV when the file name ends in .csv
+import os
+import csv
+import json
+import numpy as np
+
+# Death codes from Snake.getDeath and the name they're counted under
+DEATH_NAMES = {0: "lazy", 1: "wall", 2: "self", 3: "won", 4: "budget"}
+
+# Everything worth keeping about a finished generation as plain python types
+# timing is the generation's PhaseTimer record
+def generationMetrics(generation, fitness, scores, deaths, timing):
+    fitness = np.asarray(fitness, dtype=np.float64)
+    sortedFitness = np.sort(fitness)[::-1]
+    scores = np.asarray(scores, dtype=np.int64)
+    deaths = np.asarray(deaths)
+    return {
+        'generation': generation,
+        'bestFitness': float(sortedFitness[0]),
+        'meanFitness': float(fitness.mean()),
+        # Same median the training printout shows
+        'medianFitness': float(sortedFitness[len(sortedFitness) // 2]),
+        'worstFitness': float(sortedFitness[-1]),
+        # Child of the previous generation's 2 best
+        'childFitness': float(fitness[0]),
+        'bestScore': int(scores.max()),
+        'meanScore': float(scores.mean()),
+        # scoreCounts[s] is how many snakes ended with a score of s
+        'scoreCounts': np.bincount(scores).tolist(),
+        'deaths': {name: int((deaths == code).sum()) for code, name in DEATH_NAMES.items()},
+        'seconds': timing['seconds'],
+        'frames': timing['frames'],
+        'snakeFrames': timing['snakeFrames'],
+        'phases': timing['phases'],
+        'aliveHistogram': timing['aliveHistogram'],
+    }
+
+# Nested dicts become dotted columns like deaths.lazy, lists get stored as JSON text unless encodeLists is False
+def flatten(record, prefix="", encodeLists=True):
+    flat = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}.", encodeLists))
+        elif isinstance(value, list) and encodeLists:
+            flat[f"{prefix}{key}"] = json.dumps(value)
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+# Appends records to path, they're kept in memory and written flushEvery at a time so training doesn't wait on the disk every generation
+class MetricsWriter:
+    def __init__(self, path, flushEvery=10):
+        self.path = path
+        self.isCsv = path.endswith(".csv")
+        self.flushEvery = flushEvery
+        self.buffer = []
+        self.columns = None
+        if self.isCsv and os.path.exists(path) and os.path.getsize(path) > 0:
+            # Appending to an older run keeps its columns
+            with open(path, newline="") as f:
+                self.columns = next(csv.reader(f))
+        self.file = open(path, "a", newline="")
+
+    def write(self, record):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.flushEvery:
+            self.flush()
+
+    def flush(self):
+        if len(self.buffer) == 0:
+            return
+        if self.isCsv:
+            rows = [flatten(record) for record in self.buffer]
+            if self.columns is None:
+                self.columns = list(rows[0].keys())
+                csv.writer(self.file).writerow(self.columns)
+            csv.DictWriter(self.file, self.columns, extrasaction="ignore").writerows(rows)
+        else:
+            self.file.write("".join(json.dumps(record) + "\n" for record in self.buffer))
+        self.file.flush()
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+# Reads a JSONL or CSV metrics file back as a list of flat records, numbers as numbers
+def readMetrics(path):
+    records = []
+    with open(path, newline="") as f:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(f):
+                records.append({key: _parseCell(value) for key, value in row.items()})
+        else:
+            for line in f:
+                if line.strip():
+                    records.append(flatten(json.loads(line), encodeLists=False))
+    return records
+
+def _parseCell(value):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
@@ -3,19 +3,23 @@ import torch.nn as nn
 import torch.nn.functional as F
 import copy
 import random
+import math
+import numpy as np
 
 class EvolutionNetwork(nn.Module):
-    def __init__(self, input_size, hidden_size, output_size):
+    # device is only there so torch.nn.utils.skip_init can build one without initializing the weights
+    def __init__(self, input_size, hidden_size, output_size, device=None):
         super().__init__()
-        self.linear1 = nn.Linear(input_size, hidden_size)
-        self.linear2 = nn.Linear(hidden_size, output_size)
+        self.linear1 = nn.Linear(input_size, hidden_size, device=device)
+        self.linear2 = nn.Linear(hidden_size, output_size, device=device)
 
     def forward(self, x):
         x = F.relu(self.linear1(x))
         x = self.linear2(x)
         return x
 
-def mutateModel(originalModel, mutationRate=0.1, mutationStrength=0.1):
+# generator makes the mutation reproducible, without one it uses the global random state
+def mutateModel(originalModel, mutationRate=0.1, mutationStrength=0.1, generator=None):
     # Create a deep copy of the original model
     mutated_model = copy.deepcopy(originalModel)
 
@@ -23,17 +27,19 @@ def mutateModel(originalModel, mutationRate=0.1, mutationStrength=0.1):
     for param in mutated_model.parameters():
         # Mutate based on mutationRate
         # random.random generates a float between 0 and 1 inclusive
-        if random.random() < mutationRate:
+        roll = random.random() if generator is None else torch.rand(1, generator=generator).item()
+        if roll < mutationRate:
             # Add some noise, aka some random numbers to the whole network
-            # randn_like creates a martix in the same shape as param with each index having a number between 0 and 1
+            # randn creates a martix in the same shape as param with each index having a number between 0 and 1
             # Then multiple each one by the mutations strength to add small amounts of noise at a time
-            noise = torch.randn_like(param) * mutationStrength
+            noise = torch.randn(param.shape, generator=generator) * mutationStrength
             param.data += noise
     
     return mutated_model
 
-def averageCrossover(parentA, parentB, mutationRate=0.1):
-    child = EvolutionNetwork(92, 256, 3)
+def averageCrossover(parentA, parentB, mutationRate=0.1, generator=None):
+    # Every weight gets overwritten below, so there's no point initializing them
+    child = torch.nn.utils.skip_init(EvolutionNetwork, 92, 256, 3)
     
     # State dict stores all the values of the network
     # Pull states of both parents
@@ -51,7 +57,214 @@ def averageCrossover(parentA, parentB, mutationRate=0.1):
     child.load_state_dict(child_state_dict)
 
     # Add a bit of mutation to the child
-    child = mutateModel(child, mutationRate=mutationRate)
+    child = mutateModel(child, mutationRate=mutationRate, generator=generator)
 
     # Return new child
     return child
+
+# Name and shape of every weight and bias of an EvolutionNetwork, in parameters() order
+# This is the layout of one flattened genome row
+def parameterShapes(inputSize=92, hiddenSize=256, outputSize=3):
+    return [
+        ('linear1.weight', (hiddenSize, inputSize)),
+        ('linear1.bias', (hiddenSize,)),
+        ('linear2.weight', (outputSize, hiddenSize)),
+        ('linear2.bias', (outputSize,)),
+    ]
+
+# Number of weights and biases in one EvolutionNetwork
+def numParameters(inputSize=92, hiddenSize=256, outputSize=3):
+    return sum(math.prod(shape) for name, shape in parameterShapes(inputSize, hiddenSize, outputSize))
+
+# Splits (N, numParams) genomes into one (N, *shape) view per weight and bias, nothing gets copied
+def genomeViews(genomes, inputSize=92, hiddenSize=256, outputSize=3):
+    views = {}
+    offset = 0
+    for name, shape in parameterShapes(inputSize, hiddenSize, outputSize):
+        size = math.prod(shape)
+        views[name] = genomes[..., offset:offset + size].view(*genomes.shape[:-1], *shape)
+        offset += size
+    return views
+
+# Flattens a model into one row, same layout as genomeViews
+def modelToVector(model):
+    return torch.nn.utils.parameters_to_vector(model.parameters()).detach()
+
+# Builds a model whose weights and biases are views into row, so changing the model changes row and the other way around
+def modelFromVector(row, inputSize=92, hiddenSize=256, outputSize=3):
+    # No point initializing weights that are about to be replaced
+    model = torch.nn.utils.skip_init(EvolutionNetwork, inputSize, hiddenSize, outputSize)
+    views = genomeViews(row, inputSize, hiddenSize, outputSize)
+    for name, param in model.named_parameters():
+        param.data = views[name]
+    return model
+
+# Every genome of the population stored as one row of a (N, numParams) tensor
+# There are 2 slabs of rows so the next generation can be built while the current one is still being read from
+class Population:
+    # buffers can be given to keep the genomes somewhere specific, like a shared memory block, it has to be (2, N, numParams)
+    # seed makes the starting weights and every later generation reproducible
+    def __init__(self, numSnakes, inputSize=92, hiddenSize=256, outputSize=3, buffers=None, seed=None):
+        self.numSnakes = numSnakes
+        self.generator = torch.Generator()
+        if seed is None:
+            self.generator.seed()
+        else:
+            self.generator.manual_seed(seed)
+        self.sizes = (inputSize, hiddenSize, outputSize)
+        self.numParams = numParameters(*self.sizes)
+        if buffers is None:
+            buffers = torch.empty((2, numSnakes, self.numParams), dtype=torch.float32)
+        self.buffers = buffers
+        self.currentSlab = 0
+        # Rows of the current generation that are the last generation's best snakes, best first
+        # Nothing's been played yet, so there aren't any until the first evolve
+        self.eliteRows = []
+        self.randomize()
+
+    # Rows of the current generation
+    @property
+    def genomes(self):
+        return self.buffers[self.currentSlab]
+
+    # Rows the next generation gets written into
+    def nextGenomes(self):
+        return self.buffers[1 - self.currentSlab]
+
+    def swap(self):
+        self.currentSlab = 1 - self.currentSlab
+
+    # Same starting weights nn.Linear would give, uniform between +-1/sqrt(fan in)
+    @torch.no_grad()
+    def randomize(self):
+        for name, view in genomeViews(self.genomes, *self.sizes).items():
+            fanIn = self.sizes[0] if name.startswith('linear1') else self.sizes[1]
+            bound = 1 / math.sqrt(fanIn)
+            view.uniform_(-bound, bound, generator=self.generator)
+
+    # EvolutionNetwork for snake i that shares its weights with the population
+    def getModel(self, i):
+        return modelFromVector(self.genomes[i], *self.sizes)
+
+    def models(self):
+        return [self.getModel(i) for i in range(self.numSnakes)]
+
+    def network(self):
+        return PopulationNetwork.fromFlat(self.genomes, *self.sizes)
+
+    @torch.no_grad()
+    def loadModels(self, models):
+        for i, model in enumerate(models):
+            self.genomes[i] = modelToVector(model)
+
+    # genomes can be a tensor or any array, going through numpy converts float16 and reads memory mapped checkpoints without another copy
+    @torch.no_grad()
+    def loadGenomes(self, genomes):
+        self.genomes.numpy()[:] = np.asarray(genomes)
+
+    # Builds the next generation from the fitness of the current one, all rows at once
+    # Row 0 is the crossover of the 2 best, unmutated
+    # The next numSnakes // 10 rows are the best of the current generation, copied as is
+    # Every other row is a mutated copy of row 0
+    @torch.no_grad()
+    def evolve(self, fitness, crossover="average", mutationRate=1, mutationStrength=0.1):
+        genomes = self.genomes
+        out = self.nextGenomes()
+        order = torch.argsort(torch.as_tensor(fitness), descending=True, stable=True)
+        if self.numSnakes == 1:
+            mutateRows(genomes, mutationRate, mutationStrength, out, self.generator)
+        else:
+            crossoverRows(genomes[order[0:1]], genomes[order[1:2]], out[0:1], crossover, self.generator)
+            # Elitism
+            numElites = self.numSnakes // 10
+            torch.index_select(genomes, 0, order[:numElites], out=out[1:1 + numElites])
+            self.eliteRows = list(range(1, 1 + numElites))
+            children = out[1 + numElites:]
+            mutateRows(out[0].expand_as(children), mutationRate, mutationStrength, children, self.generator)
+        self.swap()
+
+# Gaussian mutation for every row at once
+# Every single weight gets noise with chance mutationRate, unlike mutateModel which flips one coin per tensor
+@torch.no_grad()
+def mutateRows(rows, mutationRate, mutationStrength, out, generator=None):
+    noise = torch.randn(rows.shape, generator=generator)
+    noise *= mutationStrength
+    if mutationRate < 1:
+        noise *= torch.rand(rows.shape, generator=generator) < mutationRate
+    torch.add(rows, noise, out=out)
+
+# Crossover of parentsA[i] with parentsB[i] for every row at once
+# average: halfway between both parents, same as averageCrossover
+# blend: random point between both parents, one per row
+# uniform: every weight comes from either parent with a coin flip
+# singlePoint: weights up to a random cut come from parent A, the rest from parent B
+@torch.no_grad()
+def crossoverRows(parentsA, parentsB, out, method="average", generator=None):
+    if method == "average":
+        torch.lerp(parentsA, parentsB, 0.5, out=out)
+    elif method == "blend":
+        alpha = torch.rand((parentsA.shape[0], 1), generator=generator)
+        torch.lerp(parentsA, parentsB, alpha, out=out)
+    elif method == "uniform":
+        fromB = torch.rand(parentsA.shape, generator=generator) < 0.5
+        torch.where(fromB, parentsB, parentsA, out=out)
+    elif method == "singlePoint":
+        cuts = torch.randint(0, parentsA.shape[1] + 1, (parentsA.shape[0], 1), generator=generator)
+        fromB = torch.arange(parentsA.shape[1]) >= cuts
+        torch.where(fromB, parentsB, parentsA, out=out)
+    else:
+        raise Exception(f"Unknown crossover method {method}")
+
+# While more than this fraction of the snakes are alive, getActions runs the whole population instead of copying out the alive snakes' weights
+FULL_BATCH_FRACTION = 0.5
+
+# Runs every individual of the population in one forward pass instead of calling each EvolutionNetwork on its own
+# Weights are stacked into (N, input, hidden) and (N, hidden, output) so a single batched matmul covers all snakes
+class PopulationNetwork:
+    def __init__(self, weights1, biases1, weights2, biases2):
+        self.weights1 = weights1
+        self.biases1 = biases1
+        self.weights2 = weights2
+        self.biases2 = biases2
+        self.numModels = weights1.shape[0]
+        # Alive snakes the weights were last gathered for and those weights, see getActions
+        self.gatheredIdx = None
+        self.gathered = None
+
+    # genomes is (N, numParams), one flattened EvolutionNetwork per row in parameters() order
+    # The weights are views into genomes, nothing gets copied
+    @classmethod
+    def fromFlat(cls, genomes, inputSize=92, hiddenSize=256, outputSize=3):
+        views = genomeViews(torch.as_tensor(genomes), inputSize, hiddenSize, outputSize)
+        n = views['linear1.bias'].shape[0]
+        # Weights are stored (out, in) like nn.Linear, transposed to (in, out) for the matmul
+        return cls(views['linear1.weight'].transpose(1, 2),
+                   views['linear1.bias'].view(n, 1, hiddenSize),
+                   views['linear2.weight'].transpose(1, 2),
+                   views['linear2.bias'].view(n, 1, outputSize))
+
+    # states is (k, input) for the snakes in idx, returns the argmax action index of each one as a numpy array
+    @torch.no_grad()
+    def getActions(self, states, idx=None):
+        x = torch.as_tensor(states, dtype=torch.float32).unsqueeze(1)
+        if idx is None or len(idx) == self.numModels:
+            return self._forward(x, self.weights1, self.biases1, self.weights2, self.biases2)
+        idx = np.asarray(idx, dtype=np.int64)
+        if len(idx) > self.numModels * FULL_BATCH_FRACTION:
+            # Copying out the weights costs more than running the dead snakes too, their rows just get zeros
+            full = torch.zeros((self.numModels, 1, x.shape[2]))
+            full[torch.from_numpy(idx)] = x
+            return self._forward(full, self.weights1, self.biases1, self.weights2, self.biases2)[idx]
+        # Alive snakes only ever go away during a generation, so the weights only get copied again on frames where some died
+        if self.gatheredIdx is None or not np.array_equal(self.gatheredIdx, idx):
+            rows = torch.from_numpy(idx)
+            self.gathered = (self.weights1[rows], self.biases1[rows], self.weights2[rows], self.biases2[rows])
+            self.gatheredIdx = idx.copy()
+        return self._forward(x, *self.gathered)
+
+    def _forward(self, x, weights1, biases1, weights2, biases2):
+        # (k, 1, input) @ (k, input, hidden) -> (k, 1, hidden)
+        hidden = F.relu(torch.baddbmm(biases1, x, weights1))
+        # (k, 1, hidden) @ (k, hidden, output) -> (k, 1, output)
+        prediction = torch.baddbmm(biases2, hidden, weights2)
+        return prediction.squeeze(1).argmax(dim=1).numpy()
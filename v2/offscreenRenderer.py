@@ -0,0 +1,223 @@
+### Draws games straight into numpy arrays instead of a pygame window, so recordings can be turned into PNGs and GIFs on machines without a display
+### Frames are palette images, one byte per pixel indexing PALETTE, which is also what PNG and GIF store so nothing gets converted on the way out
+### Only numpy and the standard library, the PNG and GIF writers are done by hand
+import os
+import zlib
+import struct
+import numpy as np
+from config import BLOCK_SIZE
+
+# Same colors as ReplaySnakeGame.updateUi: background, body, inside of the body, food
+PALETTE = np.array([(0, 0, 0), (0, 0, 255), (0, 100, 255), (0, 0, 200)], dtype=np.uint8)
+EMPTY = 0
+BODY = 1
+FOOD = 2
+
+# Draws frames like the ones GameReplay.frames yields, a whole batch at a time
+# Every cell gets a kind (empty, body or food) and each kind has a prebuilt BLOCK_SIZE tile, so drawing is one array lookup instead of a pygame.draw.rect per cell
+class FrameRenderer:
+    def __init__(self, cols, rows, blockSize=BLOCK_SIZE):
+        self.cols = cols
+        self.rows = rows
+        self.blockSize = blockSize
+        self.width = cols * blockSize
+        self.height = rows * blockSize
+        self.tiles = np.zeros((3, blockSize, blockSize), dtype=np.uint8)
+        # Body is a full block with a 12x12 square 4 pixels in, like the pygame version
+        self.tiles[BODY] = 1
+        self.tiles[BODY, 4:16, 4:16] = 2
+        self.tiles[FOOD] = 3
+
+    # (numFrames, rows, cols) kind of every cell
+    def cellKinds(self, frames):
+        kinds = np.zeros((len(frames), self.rows, self.cols), dtype=np.uint8)
+        for f, frame in enumerate(frames):
+            body = frame['snakeBody']
+            if body:
+                cells = np.array(body, dtype=np.int64)
+                kinds[f, cells[:, 1], cells[:, 0]] = BODY
+            food = frame['food']
+            # Food goes on top, same as the draw order in pygame
+            if food is not None:
+                kinds[f, food.y, food.x] = FOOD
+        return kinds
+
+    # (numFrames, height, width) palette indices
+    def render(self, frames):
+        kinds = self.cellKinds(frames)
+        # (frames, rows, cols, blockSize, blockSize) -> (frames, rows, blockSize, cols, blockSize) lines the tiles up into whole pixel rows
+        pixels = self.tiles[kinds].transpose(0, 1, 3, 2, 4)
+        return pixels.reshape(len(frames), self.height, self.width)
+
+# Saves one (height, width) palette image as a PNG
+def writePng(path, image, palette=PALETTE, level=6):
+    height, width = image.shape
+    # Every row starts with its filter type, 0 is none
+    raw = np.zeros((height, width + 1), dtype=np.uint8)
+    raw[:, 1:] = image
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        # 8 bit palette image
+        _pngChunk(f, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0))
+        _pngChunk(f, b"PLTE", palette.astype(np.uint8).tobytes())
+        _pngChunk(f, b"IDAT", zlib.compress(raw.tobytes(), level))
+        _pngChunk(f, b"IEND", b"")
+
+def _pngChunk(f, kind, data):
+    f.write(struct.pack(">I", len(data)))
+    f.write(kind)
+    f.write(data)
+    f.write(struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+# Writes an animated GIF one frame at a time, so a whole game never has to be in memory
+# Only the rectangle that changed since the last frame gets written, the rest of the previous frame is left where it is
+# Every pixel row gets compressed on its own (a clear code at the start of each row resets the LZW table)
+# Game frames are made of a handful of different rows, so each one only gets compressed once and the rest are looked up
+class GifWriter:
+    def __init__(self, path, width, height, fps=10, palette=PALETTE, loop=True):
+        self.width = width
+        self.height = height
+        # GIF delays are in hundredths of a second
+        self.delay = max(1, round(100 / fps))
+        # Palette size has to be a power of 2, and LZW codes start at 2 bits at least
+        size = max(2, int(np.ceil(np.log2(len(palette)))))
+        self.minCodeSize = size
+        self.rowCache = {}
+        self.previous = None
+        self.file = open(path, "wb")
+        self.file.write(b"GIF89a")
+        self.file.write(struct.pack("<HHBBB", width, height, 0x80 | (size - 1), 0, 0))
+        table = np.zeros((1 << size, 3), dtype=np.uint8)
+        table[:len(palette)] = palette
+        self.file.write(table.tobytes())
+        if loop:
+            self.file.write(b"\x21\xFF\x0BNETSCAPE2.0\x03\x01\x00\x00\x00")
+
+    # image is a (height, width) palette image
+    def write(self, image):
+        f = self.file
+        top, left, bottom, right = 0, 0, self.height, self.width
+        if self.previous is not None:
+            changed = image != self.previous
+            changedRows = np.flatnonzero(changed.any(axis=1))
+            if len(changedRows) == 0:
+                # Nothing moved, a single pixel still has to be written for the frame to count
+                bottom, right = 1, 1
+            else:
+                changedCols = np.flatnonzero(changed.any(axis=0))
+                top, bottom = changedRows[0], changedRows[-1] + 1
+                left, right = changedCols[0], changedCols[-1] + 1
+        self.previous = image
+        # Graphic control extension for the frame's delay, with the frame left in place under the next one
+        f.write(struct.pack("<BBBBHBB", 0x21, 0xF9, 4, 1 << 2, self.delay, 0, 0))
+        f.write(struct.pack("<BHHHHB", 0x2C, left, top, right - left, bottom - top, 0))
+        f.write(bytes((self.minCodeSize,)))
+        data = self._compress(image[top:bottom, left:right])
+        # Data goes out in blocks of at most 255 bytes, each one starting with its length
+        for start in range(0, len(data), 255):
+            block = data[start:start + 255]
+            f.write(bytes((len(block),)))
+            f.write(block)
+        f.write(b"\x00")
+
+    def close(self):
+        self.file.write(b"\x3B")
+        self.file.close()
+
+    def _compress(self, image):
+        clear = 1 << self.minCodeSize
+        codes = []
+        widths = []
+        # Each clear code gets read with whatever width the row before it left the decoder at
+        width = self.minCodeSize + 1
+        for row in np.ascontiguousarray(image, dtype=np.uint8):
+            key = row.tobytes()
+            encoded = self.rowCache.get(key)
+            if encoded is None:
+                encoded = self.rowCache[key] = _lzwRow(key, self.minCodeSize)
+            codes.append((clear,))
+            widths.append((width,))
+            codes.append(encoded[0])
+            widths.append(encoded[1])
+            width = encoded[2]
+        # End of the image
+        codes.append((clear + 1,))
+        widths.append((width,))
+        codes = np.concatenate(codes)
+        widths = np.concatenate(widths)
+        # Codes are packed least significant bit first, one bit per array entry and then squeezed into bytes
+        starts = np.cumsum(widths) - widths
+        codeOfBit = np.repeat(np.arange(len(codes)), widths)
+        bitOfCode = np.arange(codeOfBit.shape[0]) - starts[codeOfBit]
+        bits = ((codes[codeOfBit] >> bitOfCode) & 1).astype(np.uint8)
+        return np.packbits(bits, bitorder="little").tobytes()
+
+# LZW codes for one row of pixels right after a clear code, the width each one is written with and the width the decoder ends up at
+# Widths grow the same way every GIF decoder expects: once the next free code no longer fits, from the following code on
+def _lzwRow(pixels, minCodeSize):
+    clear = 1 << minCodeSize
+    codes = []
+    widths = []
+    width = minCodeSize + 1
+    nextCode = clear + 2
+    table = {}
+    current = pixels[0]
+    for pixel in pixels[1:]:
+        key = (current, pixel)
+        code = table.get(key)
+        if code is not None:
+            current = code
+            continue
+        codes.append(current)
+        widths.append(width)
+        if nextCode > (1 << width) - 1 and width < 12:
+            width += 1
+        if nextCode < 4096:
+            table[key] = nextCode
+            nextCode += 1
+        else:
+            # Table's full, start it over
+            codes.append(clear)
+            widths.append(width)
+            width = minCodeSize + 1
+            nextCode = clear + 2
+            table = {}
+        current = pixel
+    codes.append(current)
+    widths.append(width)
+    if nextCode > (1 << width) - 1 and width < 12:
+        width += 1
+    return np.array(codes, dtype=np.int64), np.array(widths, dtype=np.int64), width
+
+# Renders frames (like GameReplay.frames) batch frames at a time and saves them
+# A path ending in .gif becomes one animated GIF, anything else is a directory that gets a <frame>.png per frame
+# Returns how many frames were written
+def exportFrames(frames, path, cols, rows, fps=10, count=None, batch=256):
+    renderer = FrameRenderer(cols, rows)
+    gif = None
+    if path.endswith(".gif"):
+        gif = GifWriter(path, renderer.width, renderer.height, fps)
+    else:
+        os.makedirs(path, exist_ok=True)
+    written = 0
+    frames = iter(frames)
+    try:
+        while count is None or written < count:
+            chunk = []
+            for frame in frames:
+                chunk.append(frame)
+                if len(chunk) == batch or (count is not None and written + len(chunk) == count):
+                    break
+            if not chunk:
+                break
+            images = renderer.render(chunk)
+            for frame, image in zip(chunk, images):
+                if gif is not None:
+                    gif.write(image)
+                else:
+                    writePng(os.path.join(path, f"{frame.get('frame', written):06d}.png"), image)
+                written += 1
+    finally:
+        if gif is not None:
+            gif.close()
+    return written
@@ -0,0 +1,117 @@
+### Plays a generation across a pool of worker processes instead of threads, which were stuck behind the GIL
+### Every worker takes a slice of the population, plays all of its games to the end and sends back fitness and stats
+import time
+import numpy as np
+import torch
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from SnakeGames.SnakeGameBatched import SnakeGameBatched
+from encoder import StateEncoder
+from fitness import computeFitness
+from recorder import GameRecorder
+from model import PopulationNetwork, numParameters
+from config import *
+
+# Games and encoders are kept around per shard size so a worker doesn't rebuild them every generation
+_workerGames = {}
+# Shared genome block, mapped once per worker
+_workerShm = None
+_workerGenomes = None
+
+def _initWorker(shmName, shape):
+    # Every process already runs a shard of its own, extra torch threads would just fight over the cores
+    torch.set_num_threads(1)
+    _attachGenomes(shmName, shape)
+
+# start is the population index of the shard's first snake, so every snake gets the same food stream it would get in a single process
+# gameArgs is (seed, w, h, useKernel) for SnakeGameBatched
+# recordTop is how many of the shard's fittest games to send back as GameRecords, the rest of the recording stays in the worker
+def _playShard(genomes, generation=0, start=0, gameArgs=(None, WIDTH, HEIGHT, GAME_BACKEND == "numba"), recordTop=0):
+    numSnakes = genomes.shape[0]
+    seed, w, h, useKernel = gameArgs
+    if (numSnakes, gameArgs) not in _workerGames:
+        _workerGames[(numSnakes, gameArgs)] = (SnakeGameBatched(numSnakes, w, h, seed=seed, useKernel=useKernel), StateEncoder(numSnakes))
+    game, encoder = _workerGames[(numSnakes, gameArgs)]
+    network = PopulationNetwork.fromFlat(genomes)
+    game.recorder = GameRecorder() if recordTop > 0 else None
+    game.reset([None] * numSnakes, generation, start)
+    actions = np.zeros(numSnakes, dtype=np.int64)
+    frames = 0
+    # Every shard gets the whole time budget, they're played at the same time
+    startTime = time.perf_counter()
+    while True:
+        if (GENERATION_FRAME_BUDGET and frames >= GENERATION_FRAME_BUDGET) or (GENERATION_TIME_BUDGET and time.perf_counter() - startTime >= GENERATION_TIME_BUDGET):
+            game.stopGames()
+            break
+        frames += 1
+        aliveIdx = game.aliveIdx
+        if aliveIdx.size == 0:
+            break
+        states = encoder.encode(game, aliveIdx)
+        actions[aliveIdx] = network.getActions(states, aliveIdx)
+        game.step(actions)
+    results = {
+        'fitness': computeFitness(game.scores, game.frameIterations, game.finalLengths, game.deaths),
+        'scores': game.scores.copy(),
+        'frameIterations': game.frameIterations.copy(),
+        'finalLengths': game.finalLengths.copy(),
+        'deaths': game.deaths.copy(),
+    }
+    if game.recorder is not None:
+        results['games'] = game.recorder.topGames(recordTop, generation, results['fitness'], game.scores, game.deaths, game.frameIterations, start)
+    return results
+
+# Runs in every worker once, maps the shared genome block for the rest of the run
+def _attachGenomes(shmName, shape):
+    global _workerShm, _workerGenomes
+    _workerShm = shared_memory.SharedMemory(name=shmName)
+    _workerGenomes = np.ndarray(shape, dtype=np.float32, buffer=_workerShm.buf)
+
+# Runs in the worker, rows start:stop of the given slab are read straight out of the shared memory block
+def _evaluateShard(slab, start, stop, generation, gameArgs, recordTop):
+    # The network weights are views into the block, nothing gets copied
+    return generation, start, _playShard(_workerGenomes[slab, start:stop], generation, start, gameArgs, recordTop)
+
+class ParallelEvaluator:
+    # seed is passed on to the games, the results are the same as playing the whole population in one process with that seed
+    # w, h and useKernel are the SnakeGameBatched settings every worker plays with
+    def __init__(self, numSnakes, numWorkers, seed=None, w=WIDTH, h=HEIGHT, useKernel=GAME_BACKEND == "numba"):
+        self.numSnakes = numSnakes
+        self.gameArgs = (seed, w, h, useKernel)
+        self.numWorkers = min(numWorkers, numSnakes)
+        self.numParams = numParameters()
+        # Every genome of the population as one float32 row, allocated once for the whole run
+        # Same (2, N, numParams) layout as Population's buffers, so a Population can live straight in it
+        shape = (2, numSnakes, self.numParams)
+        self.shm = shared_memory.SharedMemory(create=True, size=2 * numSnakes * self.numParams * 4)
+        self.genomes = torch.from_numpy(np.ndarray(shape, dtype=np.float32, buffer=self.shm.buf))
+        # Workers stay alive between generations and map the block once when they start
+        self.pool = ProcessPoolExecutor(max_workers=self.numWorkers, initializer=_initWorker, initargs=(self.shm.name, shape))
+        # Split the population as evenly as possible
+        bounds = np.linspace(0, numSnakes, self.numWorkers + 1).astype(int)
+        self.shards = [(bounds[i], bounds[i + 1]) for i in range(self.numWorkers)]
+
+    # Plays one generation using the rows of the given slab and returns per snake arrays of fitness, scores, frames, lengths and deaths
+    # Workers only get told which rows to play, the weights are already in the shared block
+    # With recordTop every shard also sends back its recordTop fittest games, results['games'] has all of them
+    def evaluate(self, slab, generation, recordTop=0):
+        futures = [self.pool.submit(_evaluateShard, slab, start, stop, generation, self.gameArgs, recordTop) for start, stop in self.shards]
+        results = {}
+        if recordTop > 0:
+            results['games'] = []
+        for future in futures:
+            shardGeneration, start, shardResults = future.result()
+            if shardGeneration != generation:
+                raise Exception(f"Worker played generation {shardGeneration} instead of {generation}")
+            if 'games' in shardResults:
+                results['games'].extend(shardResults.pop('games'))
+            for key, values in shardResults.items():
+                if key not in results:
+                    results[key] = np.zeros(self.numSnakes, dtype=values.dtype)
+                results[key][start:start + len(values)] = values
+        return results
+
+    def close(self):
+        self.pool.shutdown()
+        # The population still holds views into the block so it can't be closed here, the mapping goes away with the process
+        self.shm.unlink()
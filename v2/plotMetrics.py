@@ -0,0 +1,42 @@
+### Plots a metrics file written by main.py --metrics, so runs don't need a live plot slowing training down
+### python plotMetrics.py metrics.jsonl [--out metrics.png]
+import argparse
+import matplotlib.pyplot as plt
+from metrics import readMetrics, DEATH_NAMES
+
+FITNESS_COLUMNS = ["bestFitness", "meanFitness", "medianFitness", "worstFitness"]
+
+def plotMetrics(records, title=None):
+    generations = [record['generation'] for record in records]
+    fig, (fitnessAx, deathsAx) = plt.subplots(2, 1, sharex=True, figsize=(10, 8))
+    if title:
+        fig.suptitle(title)
+
+    for column in FITNESS_COLUMNS:
+        fitnessAx.plot(generations, [record[column] for record in records], label=column.replace("Fitness", ""))
+    fitnessAx.set_ylabel("Fitness")
+    fitnessAx.legend()
+
+    # How every generation's snakes died
+    for name in DEATH_NAMES.values():
+        deathsAx.plot(generations, [record.get(f"deaths.{name}", 0) for record in records], label=name)
+    deathsAx.set_xlabel("Generation")
+    deathsAx.set_ylabel("Snakes")
+    deathsAx.legend()
+    return fig
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    # Saves the plot to this file instead of opening a window
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    records = readMetrics(args.path)
+    if len(records) == 0:
+        raise Exception(f"No metrics in {args.path}")
+    fig = plotMetrics(records, args.path)
+    if args.out:
+        fig.savefig(args.out)
+    else:
+        plt.show()
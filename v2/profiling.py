@@ -0,0 +1,50 @@
+### Per phase timing of every generation, cheap enough to always be on
+### Every phase Agent times is also its own method (getStates, getActions, stepGame...), so they show up by name in cProfile or py-spy too
+import time
+import numpy as np
+
+# Phases in the order they happen in a generation
+# evaluate is the whole game played in the worker processes, it replaces encode, inference and step when there are workers
+# checkpoint is only the copy of the population handed to the background writer, the writing itself isn't on the training thread
+# record is picking out and writing the recorded games, logging the moves while playing counts towards step
+PHASES = ["encode", "inference", "step", "render", "evaluate", "fitness", "record", "evolve", "reset", "checkpoint"]
+
+class PhaseTimer:
+    def __init__(self):
+        self.startGeneration(0)
+
+    # Starts from zero for a new generation
+    def startGeneration(self, generation):
+        self.generation = generation
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.start = time.perf_counter()
+
+    # Adds the time since mark to phase name and returns the current time, so one phase can start where the last one ended
+    def lap(self, name, mark):
+        now = time.perf_counter()
+        self.totals[name] += now - mark
+        return now
+
+    # Everything about the generation as plain python types, ready to be printed or written to a file
+    # frameIterations is how many frames every snake lasted, the snakes alive on each frame are worked out from it
+    def record(self, frameIterations, bins=10):
+        frameIterations = np.asarray(frameIterations)
+        frames = int(frameIterations.max(initial=0))
+        # Snake i was still playing on frame f (1 based) if it lasted at least f frames
+        sortedFrames = np.sort(frameIterations)
+        alive = len(sortedFrames) - np.searchsorted(sortedFrames, np.arange(1, frames + 1), side='left')
+        counts, edges = np.histogram(alive, bins=bins, range=(0, len(sortedFrames)))
+        return {
+            'generation': self.generation,
+            'seconds': time.perf_counter() - self.start,
+            'frames': frames,
+            'snakeFrames': int(frameIterations.sum()),
+            'phases': dict(self.totals),
+            # How many frames had a number of snakes alive in each bin
+            'aliveHistogram': {'edges': edges.tolist(), 'counts': counts.tolist()},
+        }
+
+# One line summary of the phases that took any time, like "step 0.52s (40%)"
+def formatPhases(record):
+    total = sum(record['phases'].values()) or 1
+    return ", ".join(f"{name} {seconds:.2f}s ({seconds / total:.0%})" for name, seconds in record['phases'].items() if seconds > 0)
@@ -0,0 +1,195 @@
+### Records games so they can be watched again later with ReplaySnakeGame
+### Only what can't be worked out again gets kept: the starting body, one byte per move and every cell food showed up in
+### Games are appended to one binary file, a small file header followed by one record per game, so writing never rewrites anything
+### Reading memory maps the file and frames get worked out only when they're asked for, so even games hours long never get loaded whole
+import os
+import struct
+from collections import deque, namedtuple
+import numpy as np
+from config import AMOUNT_OF_FRAMES_TO_DEATH_MULTIPLIER
+
+MAGIC = b"SNAKEREC"
+VERSION = 1
+# version, board columns, board rows
+FILE_HEADER = struct.Struct("<IHH")
+# generation, snake index, fitness, score, death, starting direction, starting body length, number of moves, number of food cells
+GAME_HEADER = struct.Struct("<IIfIbBHII")
+
+# Body and food cells are flat indices x * rows + y, moves are action indices (0 straight, 1 right, 2 left)
+GameRecord = namedtuple('GameRecord', 'generation, snake, fitness, score, death, startDirection, startBody, moves, food')
+Point = namedtuple('Point', 'x, y')
+
+# Same clockwise deltas as the engines
+DIRECTION_DX = [1, 0, -1, 0]
+DIRECTION_DY = [0, 1, 0, -1]
+
+# How many frames apart the snapshots GameReplay seeks from are
+KEYFRAME_INTERVAL = 1024
+# How many moves get copied out of the file at a time while decoding
+MOVE_CHUNK = 65536
+
+# Logs every snake's moves and food while an engine plays a generation, the engines call it when their recorder is set
+# Moves are kept as one byte per snake per frame, which snakes end up worth saving isn't known until the generation is over
+class GameRecorder:
+    def __init__(self):
+        self.startGeneration(0, [], 0)
+
+    # Called by the engines' reset before any food gets placed, startBody is the cells every snake starts with, head first
+    def startGeneration(self, numSnakes, startBody, startDirection):
+        self.frames = []
+        self.food = [[] for i in range(numSnakes)]
+        self.startBody = [int(cell) for cell in startBody]
+        self.startDirection = int(startDirection)
+
+    # actions is the action index of every snake for this frame, dead snakes' entries are never read
+    def logMoves(self, actions):
+        self.frames.append(np.array(actions, dtype=np.uint8))
+
+    def logFood(self, i, cell):
+        self.food[i].append(int(cell))
+
+    # Records of the k fittest snakes, snakeOffset is added to the snake indices when this game only played a slice of the population
+    def topGames(self, k, generation, fitness, scores, deaths, frameIterations, snakeOffset=0):
+        if k <= 0 or len(self.frames) == 0:
+            return []
+        fitness = np.asarray(fitness, dtype=np.float64)
+        best = np.argsort(-fitness, kind="stable")[:k]
+        moves = np.stack(self.frames)
+        return [GameRecord(generation, int(i) + snakeOffset, float(fitness[i]), int(scores[i]), int(deaths[i]),
+                           self.startDirection, self.startBody, moves[:frameIterations[i], i].tobytes(), list(self.food[i]))
+                for i in best]
+
+# Appends GameRecords to path, the file header gets written when the file is new
+class TrajectoryWriter:
+    def __init__(self, path, cols, rows):
+        self.cols = cols
+        self.rows = rows
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                fileCols, fileRows = _readFileHeader(f)
+            if (fileCols, fileRows) != (cols, rows):
+                raise Exception(f"{path} has games on a {fileCols}x{fileRows} board, not {cols}x{rows}")
+            self.file = open(path, "ab")
+        else:
+            self.file = open(path, "ab")
+            self.file.write(MAGIC)
+            self.file.write(FILE_HEADER.pack(VERSION, cols, rows))
+
+    def write(self, record):
+        self.file.write(GAME_HEADER.pack(record.generation, record.snake, record.fitness, record.score, record.death,
+                                         record.startDirection, len(record.startBody), len(record.moves), len(record.food)))
+        self.file.write(np.asarray(record.startBody, dtype="<u2").tobytes())
+        self.file.write(record.moves)
+        self.file.write(np.asarray(record.food, dtype="<u2").tobytes())
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def _readFileHeader(f):
+    return _parseFileHeader(f.read(len(MAGIC) + FILE_HEADER.size), f.name)
+
+def _parseFileHeader(data, name):
+    if len(data) < len(MAGIC) + FILE_HEADER.size or bytes(data[:len(MAGIC)]) != MAGIC:
+        raise Exception(f"{name} is not a game recording")
+    version, cols, rows = FILE_HEADER.unpack_from(data, len(MAGIC))
+    if version > VERSION:
+        raise Exception(f"{name} is recording version {version}, this code only reads up to {VERSION}")
+    return cols, rows
+
+# Board size of a recording
+def readBoard(path):
+    with open(path, "rb") as f:
+        return _readFileHeader(f)
+
+# Yields every GameRecord in the file one at a time, the file is memory mapped instead of read
+# Each record's moves are a view into the map, so nothing but the game headers gets read from disk until the moves are replayed
+def readGames(path):
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    _parseFileHeader(data, path)
+    offset = len(MAGIC) + FILE_HEADER.size
+    while offset + GAME_HEADER.size <= len(data):
+        generation, snake, fitness, score, death, startDirection, bodyLength, numMoves, numFood = GAME_HEADER.unpack_from(data, offset)
+        offset += GAME_HEADER.size
+        if offset + 2 * bodyLength + numMoves + 2 * numFood > len(data):
+            # A game that was still being written
+            return
+        startBody = data[offset:offset + 2 * bodyLength].view("<u2").tolist()
+        offset += 2 * bodyLength
+        moves = data[offset:offset + numMoves]
+        offset += numMoves
+        # There's never more food than cells on the board, so this one is small enough to just read
+        food = data[offset:offset + 2 * numFood].view("<u2").tolist()
+        offset += 2 * numFood
+        yield GameRecord(generation, snake, fitness, score, death, startDirection, startBody, moves, food)
+
+# Frames of one GameRecord, worked out with the engines' rules only as they're asked for
+# Every KEYFRAME_INTERVAL frames the snake's state gets saved on the way, so frames(start) picks up from the closest one before start
+# instead of playing the whole game again, seeking ahead still has to go through every frame once
+class GameReplay:
+    def __init__(self, record, cols, rows, keyframeInterval=KEYFRAME_INTERVAL):
+        self.record = record
+        self.cols = cols
+        self.rows = rows
+        self.keyframeInterval = keyframeInterval
+        # frame, direction, index of the current food, body cells head first
+        self.keyframes = [(0, record.startDirection, 0, tuple(record.startBody))]
+
+    # Yields {'frame', 'snakeBody', 'food'} for every frame from start on, frame 0 is the starting position
+    # The move that killed the snake doesn't make a frame of its own
+    def frames(self, start=0):
+        cols = self.cols
+        rows = self.rows
+        moves = self.record.moves
+        foodCells = self.record.food
+        interval = self.keyframeInterval
+        frame, direction, foodIndex, body = self.keyframes[min(start // interval, len(self.keyframes) - 1)]
+        body = deque(body)
+        occupied = set(body)
+        chunkStart = frame
+        chunk = b""
+
+        while True:
+            if frame == len(self.keyframes) * interval:
+                self.keyframes.append((frame, direction, foodIndex, tuple(body)))
+            if frame >= start:
+                yield self._frame(frame, body, foodIndex)
+            if frame >= len(moves):
+                return
+
+            # Moves get copied out a chunk at a time, indexing the map one byte at a time is a lot slower
+            if frame - chunkStart >= len(chunk):
+                chunkStart = frame
+                chunk = bytes(moves[frame:frame + MOVE_CHUNK])
+            action = chunk[frame - chunkStart]
+
+            direction = (direction + (0, 1, -1)[action]) % 4
+            head = body[0]
+            x = head // rows + DIRECTION_DX[direction]
+            y = head % rows + DIRECTION_DY[direction]
+            newHead = x * rows + y
+            # Same checks as the engines, the tail hasn't moved yet so running into it counts
+            if x < 0 or x >= cols or y < 0 or y >= rows or newHead in occupied:
+                return
+            if frame + 1 > AMOUNT_OF_FRAMES_TO_DEATH_MULTIPLIER * (len(body) + 1):
+                return
+            body.appendleft(newHead)
+            occupied.add(newHead)
+            if foodIndex < len(foodCells) and newHead == foodCells[foodIndex]:
+                foodIndex += 1
+            else:
+                occupied.discard(body.pop())
+            frame += 1
+
+    def _frame(self, frame, body, foodIndex):
+        rows = self.rows
+        food = self.record.food
+        return {'frame': frame,
+                'snakeBody': [Point(cell // rows, cell % rows) for cell in body],
+                'food': Point(food[foodIndex] // rows, food[foodIndex] % rows) if foodIndex < len(food) else None}
+
+# Frames of a record from start on, see GameReplay
+def replayFrames(record, cols, rows, start=0):
+    return GameReplay(record, cols, rows).frames(start)
@@ -0,0 +1,61 @@
+### Watch games saved with main.py --record
+### python replay.py FILE lists every game in it, python replay.py FILE GAME plays game number GAME (from the list)
+### --start FRAME skips ahead, --export PATH saves the frames without opening a window, as one GIF if PATH ends in .gif or as PNGs in the directory PATH
+### Exporting without a GAME saves every game in the file, or just the --best fittest ones, to PATH/<game>.gif or PATH/<game>/
+import os
+import argparse
+from recorder import readBoard, readGames, replayFrames
+from metrics import DEATH_NAMES
+from config import SPEED
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("game", nargs="?", type=int, default=None)
+    # Frames per second to play at, or for the exported GIFs
+    parser.add_argument("--speed", type=int, default=SPEED)
+    parser.add_argument("--start", type=int, default=0)
+    parser.add_argument("--export", default=None)
+    # Most frames to export per game, all of them by default
+    parser.add_argument("--count", type=int, default=None)
+    # Export every game as a GIF instead of PNGs
+    parser.add_argument("--gif", action="store_true")
+    parser.add_argument("--best", type=int, default=None)
+    args = parser.parse_args()
+
+    cols, rows = readBoard(args.path)
+    if args.export is not None:
+        # Imported here so just listing or playing never needs it
+        from offscreenRenderer import exportFrames
+        if args.game is not None:
+            games = [(args.game, gameRecord(args.path, args.game))]
+            paths = [args.export]
+        else:
+            games = list(enumerate(readGames(args.path)))
+            if args.best is not None:
+                games = sorted(games, key=lambda game: game[1].fitness, reverse=True)[:args.best]
+            paths = [os.path.join(args.export, f"{i}.gif" if args.gif else str(i)) for i, record in games]
+            os.makedirs(args.export, exist_ok=True)
+        for (i, record), path in zip(games, paths):
+            saved = exportFrames(replayFrames(record, cols, rows, args.start), path, cols, rows, args.speed, args.count)
+            print(f"Saved {saved} frames of game {i} to {path}")
+        return
+
+    if args.game is None:
+        for i, record in enumerate(readGames(args.path)):
+            print(f"{i}: generation {record.generation}, snake {record.snake}, score {record.score}, "
+                  f"fitness {record.fitness:.1f}, {DEATH_NAMES.get(record.death, record.death)} death after {len(record.moves)} moves")
+        return
+
+    # Imported here so listing the games doesn't open a window
+    from SnakeGames.ReplaySnakeGame import ReplaySnakeGame
+    ReplaySnakeGame.fromRecord(gameRecord(args.path, args.game), cols, rows, args.speed, args.start).play()
+
+def gameRecord(path, game):
+    record = next((record for i, record in enumerate(readGames(path)) if i == game), None)
+    if record is None:
+        raise Exception(f"{path} has no game {game}")
+    return record
+
+if __name__ == "__main__":
+    main()
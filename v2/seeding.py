@@ -0,0 +1,11 @@
+### Random number streams for the games
+### Every snake gets its own stream per generation, so its game plays out the same no matter which engine, process or order it gets played in
+import numpy as np
+
+# One numpy Generator per snake in ids for the given generation
+# The same seed, generation and snake index always give the same stream, like SeedSequence(seed).spawn but without spawning every earlier child first
+# seed None gives fresh unseeded streams every time
+def snakeRngs(seed, generation, ids):
+    if seed is None:
+        return [np.random.default_rng() for i in ids]
+    return [np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(generation, int(i)))) for i in ids]